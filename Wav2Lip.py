@@ -5,17 +5,66 @@ import torch
 import numpy as np
 from tqdm import tqdm
 from moviepy.editor import VideoFileClip, AudioFileClip
-from models import Wav2Lip
+from models import Wav2Lip, fuse_for_inference
 import audio
+from hparams import hparams as hp
 from datetime import datetime
 import shutil
 import time
+import uuid
+import hashlib
+import tempfile
+import threading
+import queue
+from collections import OrderedDict
 import face_detection
+from wav2lip_export import OnnxWav2Lip, exported_path
 from dotenv import load_dotenv
 
 load_dotenv()
 weights_relative_path = os.getenv("MODEL_DIR")
 
+# Rough peak memory of one S3FD forward pass per input pixel (activations
+# plus the float copies batch_detect makes): about 800 B/px measured on CPU,
+# rounded up for headroom
+SFD_BYTES_PER_PIXEL = 900
+
+# Still avatars larger than this (px, longer side) are downscaled before face
+# detection; the box is scaled back up, so output stays at full resolution
+STILL_DETECT_MAX_SIDE = 1280
+
+def cpu_supports_bf16():
+    """True when the CPU has native bf16 matmul/conv paths (AVX512-BF16 or AMX)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def build_face_detector(
+    detector_backend="sfd",
+    device="cpu",
+    min_face_size=None,
+    max_face_size=None,
+    sfd_backend="torch",
+):
+    """Builds the face_detection detector used by Processor.face_detect1."""
+    face_detector_kwargs = {}
+    if detector_backend == "sfd":
+        face_detector_kwargs = {
+            "min_face_size": min_face_size,
+            "max_face_size": max_face_size,
+            "backend": sfd_backend,
+        }
+    return face_detection.FaceAlignment(
+        face_detection.LandmarksType._2D,
+        flip_input=False,
+        device=device,
+        face_detector=detector_backend,
+        face_detector_kwargs=face_detector_kwargs,
+    )
+
 class Processor:
     def __init__(
         self,
@@ -25,11 +74,92 @@ class Processor:
         ),
         nosmooth=False,
         static=False,
+        fuse_bn=True,
+        backend="torch",
+        device=None,
+        channels_last=False,
+        bf16=False,
+        audio_embedding_cache_size=16,
+        silence_db=None,
+        frame_stride=1,
+        detector_memory_mb=None,
+        detector_backend="haar",
+        min_face_size=None,
+        max_face_size=None,
+        sfd_backend="torch",
     ):
         self.checkpoint_path = checkpoint_path
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        if device is None:
+            # Quantized kernels only run on the CPU
+            if backend != "int8" and torch.cuda.is_available():
+                device = "cuda"
+            else:
+                device = "cpu"
+        self.device = device
         self.static = static
         self.nosmooth = nosmooth
+        # Fold BatchNorm into the convolutions of the loaded generator
+        self.fuse_bn = fuse_bn
+        # "torch" runs the eager model; "torchscript" and "onnx" load the
+        # files written by wav2lip_export.py next to the checkpoint, "int8"
+        # the one written by wav2lip_quant.py
+        self.backend = backend
+        # Eager CPU options: NHWC memory layout and bf16 autocast
+        self.channels_last = channels_last and backend == "torch"
+        self.bf16 = bf16 and backend == "torch" and self.device == "cpu"
+        if self.bf16 and not cpu_supports_bf16():
+            # Emulated bf16 is slower than fp32, so don't bother
+            print("CPU lacks native bf16 support, running Wav2Lip in fp32")
+            self.bf16 = False
+        # Loaded on first use and kept for the lifetime of the processor
+        self.model = None
+        self.face_detector = None
+        # detectMultiScale isn't safe to call concurrently on one classifier,
+        # so every request thread gets its own Haar cascade
+        self._thread_state = threading.local()
+        # "haar" (default) runs the OpenCV cascade in face_detect; any other
+        # value is an opt-in face_detection.detection module run by
+        # face_detect1: "sfd", or the much lighter OpenCV DNN "yunet"
+        self.detector_backend = detector_backend
+        # Expected face size bounds (px) for SFD; it downscales frames and
+        # skips detection heads outside them. None leaves a side unbounded
+        self.min_face_size = min_face_size
+        self.max_face_size = max_face_size
+        if detector_backend != "sfd" and (min_face_size or max_face_size):
+            print(f"Face size bounds only apply to the sfd detector, ignoring them for {detector_backend}")
+        # "torch", or "onnx"/"int8" to run SFD with ONNX Runtime from the
+        # files sfd_export.py writes next to s3fd.pth
+        self.sfd_backend = sfd_backend
+        if detector_backend != "sfd" and sfd_backend != "torch":
+            print(f"sfd_backend only applies to the sfd detector, ignoring it for {detector_backend}")
+        # Memory the SFD detector may use per batch; None picks half the free
+        # GPU memory, or 2 GB on CPU
+        self.detector_memory_mb = detector_memory_mb
+        # Batch size chosen for each frame resolution, reused across requests
+        self._detector_batch_sizes = {}
+        # Face boxes of recent still avatars, keyed by image content
+        self._still_face_boxes = OrderedDict()
+        self._still_face_boxes_size = 16
+        self._still_face_lock = threading.Lock()
+        # PNG backgrounds written for recent still avatars, keyed the same way
+        self._backgrounds = OrderedDict()
+        self._backgrounds_size = 16
+        # Audio encoder outputs of recent requests, keyed by mel content
+        self.audio_embedding_cache_size = audio_embedding_cache_size
+        self._audio_embedding_cache = OrderedDict()
+        self._audio_embedding_lock = threading.Lock()
+        # Static avatars give mel windows whose loudest frame averages below
+        # silence_db a closed-mouth face cached per face crop; None disables
+        self.silence_db = silence_db
+        self._closed_mouth_cache = OrderedDict()
+        self._closed_mouth_cache_size = 64
+        self._stats_lock = threading.Lock()
+        self.frames_generated = 0
+        self.frames_skipped = 0
+        # Run the generator on every frame_stride-th frame only and blend the
+        # mouth crops in between
+        self.frame_stride = max(1, int(frame_stride))
+        self.frames_interpolated = 0
 
     def get_smoothened_boxes(self, boxes, T):
         for i in range(len(boxes)):
@@ -40,16 +170,23 @@ class Processor:
             boxes[i] = np.mean(window, axis=0)
         return boxes
 
+    def get_face_cascade(self):
+        face_cascade = getattr(self._thread_state, "face_cascade", None)
+        if face_cascade is None:
+            # Load the pre-trained Haar Cascade Classifier for face detection
+            face_cascade = cv2.CascadeClassifier(
+                os.path.join(
+                    weights_relative_path,
+                    "wav2lip",
+                    "haarcascade_frontalface_default.xml",
+                )
+            )  # cv2.data.haarcascades
+            self._thread_state.face_cascade = face_cascade
+        return face_cascade
+
     def face_detect(self, images):
         print("Detecting Faces")
-        # Load the pre-trained Haar Cascade Classifier for face detection
-        face_cascade = cv2.CascadeClassifier(
-            os.path.join(
-                weights_relative_path,
-                "wav2lip",
-                "haarcascade_frontalface_default.xml",
-            )
-        )  # cv2.data.haarcascades
+        face_cascade = self.get_face_cascade()
         pads = [0, 10, 0, 0]
         results = []
         pady1, pady2, padx1, padx2 = pads
@@ -100,21 +237,51 @@ class Processor:
             boxes[i] = np.mean(window, axis=0)
         return boxes
 
+    def get_face_detector(self):
+        if self.face_detector is None:
+            # Loaded once and kept, so s3fd.pth isn't re-read on every request.
+            # The server passes in the registry's shared instance instead
+            self.face_detector = build_face_detector(
+                self.detector_backend,
+                self.device,
+                self.min_face_size,
+                self.max_face_size,
+                self.sfd_backend,
+            )
+        return self.face_detector
+
+    def detector_batch_size(self, frame_shape):
+        """Picks how many frames of this size fit one SFD batch within the memory budget."""
+        height, width = frame_shape[:2]
+        if (height, width) not in self._detector_batch_sizes:
+            budget = self.detector_memory_mb
+            if budget is not None:
+                budget = budget * 1024 * 1024
+            elif self.device == "cuda":
+                budget = torch.cuda.mem_get_info()[0] // 2
+            else:
+                budget = 2048 * 1024 * 1024
+            # SFD runs on frames downscaled by its input_scale
+            scale = getattr(self.get_face_detector().face_detector, "input_scale", 1.0)
+            batch_size = budget // (height * width * scale * scale * SFD_BYTES_PER_PIXEL)
+            self._detector_batch_sizes[(height, width)] = int(min(1024, max(1, batch_size)))
+        return self._detector_batch_sizes[(height, width)]
+
     def face_detect1(self, images):
-        detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
-                                                flip_input=False, device='cuda')
+        detector = self.get_face_detector()
+        batch_size = self.detector_batch_size(images[0].shape)
 
-        batch_size = 1024
-        
         while 1:
             predictions = []
             try:
                 for i in range(0, len(images), batch_size):
                     predictions.extend(detector.get_detections_for_batch(np.array(images[i:i + batch_size])))
             except RuntimeError:
+                # The estimate was off; shrink and remember it for this resolution
                 if batch_size == 1: 
-                    raise RuntimeError('Image too big to run face detection on GPU. Please use the --resize_factor argument')
+                    raise RuntimeError('Image too big to run face detection. Please use the --resize_factor argument')
                 batch_size //= 2
+                self._detector_batch_sizes[images[0].shape[:2]] = batch_size
                 print('Recovering from OOM error; New batch size: {}'.format(batch_size))
                 continue
             break
@@ -134,34 +301,76 @@ class Processor:
             results.append([x1, y1, x2, y2])
 
         boxes = np.array(results)
-        nosmooth = False
-        if not nosmooth: boxes = self.get_smoothened_boxes(boxes, T=5)
+        if not self.nosmooth: boxes = self.get_smoothened_boxes(boxes, T=5)
         results = [[image[y1: y2, x1:x2], (y1, y2, x1, x2)] for image, (x1, y1, x2, y2) in zip(images, boxes)]
 
-        del detector
         return results 
 
-    def datagen(self, frames, mels):
-        img_size = 96
+    def detect_faces(self, frames):
         box = [-1, -1, -1, -1]
-        wav2lip_batch_size = 128
-        img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
-
         if box[0] == -1:
-            if not self.static:
-                face_det_results = self.face_detect(
+            face_detect = self.face_detect if self.detector_backend == "haar" else self.face_detect1
+            if not self.static and len(frames) > 1:
+                face_det_results = face_detect(
                     frames
                 )  # BGR2RGB for CNN face detection
             else:
-                face_det_results = self.face_detect([frames[0]])
+                face_det_results = [self.detect_still_face(frames[0], face_detect)]
         else:
             print("Using the specified bounding box instead of face detection...")
             y1, y2, x1, x2 = box
             face_det_results = [[f[y1:y2, x1:x2], (y1, y2, x1, x2)] for f in frames]
+        return face_det_results
+
+    def still_key(self, frame):
+        height, width = frame.shape[:2]
+        return hashlib.sha1(frame.tobytes()).hexdigest() + f"_{width}x{height}"
+
+    def detect_still_face(self, frame, face_detect):
+        """
+        Returns [face crop, (y1, y2, x1, x2)] for a still avatar. Images larger
+        than STILL_DETECT_MAX_SIDE are detected on a downscaled copy, and the
+        box is cached by image content so later requests skip detection.
+        """
+        height, width = frame.shape[:2]
+        key = self.still_key(frame)
+        with self._still_face_lock:
+            box = self._still_face_boxes.get(key)
+            if box is not None:
+                self._still_face_boxes.move_to_end(key)
+
+        if box is None:
+            scale = min(1.0, STILL_DETECT_MAX_SIDE / max(height, width))
+            image = frame
+            if scale < 1:
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                image = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            _, (y1, y2, x1, x2) = face_detect([image])[0]
+            box = (
+                max(0, int(y1 / scale)),
+                min(height, int(round(y2 / scale))),
+                max(0, int(x1 / scale)),
+                min(width, int(round(x2 / scale))),
+            )
+            with self._still_face_lock:
+                self._still_face_boxes[key] = box
+                while len(self._still_face_boxes) > self._still_face_boxes_size:
+                    self._still_face_boxes.popitem(last=False)
 
-        for i, m in enumerate(mels):
+        y1, y2, x1, x2 = box
+        return [frame[y1:y2, x1:x2], box]
+
+    def datagen(self, frames, mels, face_det_results=None, start_index=0, wav2lip_batch_size=128, with_frames=True):
+        img_size = 96
+        img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
+
+        if face_det_results is None:
+            face_det_results = self.detect_faces(frames)
+
+        for i, m in enumerate(mels, start_index):
             idx = 0 if self.static else i % len(frames)
-            frame_to_save = frames[idx].copy()
+            # Crop-only rendering never touches the full frame, so skip the copy
+            frame_to_save = frames[idx].copy() if with_frames else None
             face, coords = face_det_results[idx].copy()
 
             face = cv2.resize(face, (img_size, img_size))
@@ -208,6 +417,15 @@ class Processor:
         return checkpoint
 
     def load_model(self, path):
+        if self.backend in ("torchscript", "int8"):
+            path = exported_path(path, self.backend)
+            print("Load TorchScript model from: {}".format(path))
+            return torch.jit.load(path, map_location=self.device).eval()
+        if self.backend == "onnx":
+            path = exported_path(path, self.backend)
+            print("Load ONNX model from: {}".format(path))
+            return OnnxWav2Lip(path, self.device)
+
         model = Wav2Lip()
         print("Load checkpoint from: {}".format(path))
         checkpoint = self._load(path)
@@ -217,21 +435,203 @@ class Processor:
             new_s[k.replace("module.", "")] = v
         model.load_state_dict(new_s)
 
-        model = model.to(self.device)
-        return model.eval()
+        model = model.to(self.device).eval()
+        if self.fuse_bn:
+            model = fuse_for_inference(model)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        return model
+
+    def audio_embeddings(self, mel_chunks, batch_size=1024, cache=True):
+        """
+        Runs the audio encoder over all mel windows up front in large batches,
+        returning (N, 512, 1, 1) embeddings for render() to feed the decoder.
+        Recent results are cached by mel content, so rendering the same audio
+        onto another avatar skips the encoder; cache=False skips the lookup
+        and the insert for audio that won't come again. Returns None for
+        exported backends, whose graphs only take mel windows.
+        """
+        if self.backend != "torch" or len(mel_chunks) == 0:
+            return None
+        if self.model is None:
+            self.model = self.load_model(self.checkpoint_path)
+
+        mels = np.ascontiguousarray(np.asarray(mel_chunks, dtype=np.float32))
+        key = hashlib.sha1(mels.tobytes()).hexdigest() if cache else None
+        with self._audio_embedding_lock:
+            if cache and key in self._audio_embedding_cache:
+                self._audio_embedding_cache.move_to_end(key)
+                return self._audio_embedding_cache[key]
+
+        mels = torch.from_numpy(mels).unsqueeze(1).to(self.device)
+        embeddings = []
+        with torch.inference_mode(), torch.autocast(
+            "cpu", dtype=torch.bfloat16, enabled=self.bf16
+        ):
+            for i in range(0, len(mels), batch_size):
+                embeddings.append(self.model.encode_audio(mels[i : i + batch_size]))
+        embeddings = torch.cat(embeddings)
+        if not cache:
+            return embeddings
+
+        with self._audio_embedding_lock:
+            self._audio_embedding_cache[key] = embeddings
+            while len(self._audio_embedding_cache) > self.audio_embedding_cache_size:
+                self._audio_embedding_cache.popitem(last=False)
+        return embeddings
+
+    def infer(self, mel_batch, img_batch, audio_embedding=None):
+        """
+        Runs the generator on NHWC numpy batches, returning NHWC float32
+        predictions. With audio_embedding (from audio_embeddings()) only the
+        face encoder and decoder run.
+        """
+        # Permuting NHWC gives channels_last strides, so no copy is needed for that layout
+        img_batch = torch.from_numpy(img_batch).permute(0, 3, 1, 2)
+        memory_format = (
+            torch.channels_last if self.channels_last else torch.contiguous_format
+        )
+        img_batch = img_batch.to(
+            self.device, torch.float32, memory_format=memory_format
+        )
+        if audio_embedding is None:
+            mel_batch = torch.from_numpy(mel_batch).permute(0, 3, 1, 2)
+            mel_batch = mel_batch.to(
+                self.device, torch.float32, memory_format=memory_format
+            )
 
-    def run(
+        with torch.inference_mode(), torch.autocast(
+            "cpu", dtype=torch.bfloat16, enabled=self.bf16
+        ):
+            if audio_embedding is None:
+                pred = self.model(mel_batch, img_batch)
+            else:
+                pred = self.model.decode(audio_embedding, img_batch)
+
+        return pred.float().cpu().numpy().transpose(0, 2, 3, 1)
+
+    def silent_windows(self, mel_batch):
+        """Flags the (B, 80, 16, 1) mel windows that are silent under silence_db."""
+        if self.silence_db is None:
+            return np.zeros(len(mel_batch), dtype=bool)
+        # Undo melspectrogram's normalisation back to dB
+        db = (mel_batch + hp.max_abs_value) / (2 * hp.max_abs_value)
+        db = db * -hp.min_level_db + hp.min_level_db
+        # Per-frame mean over mel bins, then the loudest frame in each window
+        return db.mean(axis=1).max(axis=(1, 2)) < self.silence_db
+
+    def closed_mouth(self, img_batch):
+        """
+        Returns the generator output for silent audio for each face in the
+        NHWC batch of a static avatar. Its crops are all the same face, so the
+        closed mouth is rendered once and cached by the crop's content.
+        """
+        key = hashlib.sha1(img_batch[0].tobytes()).hexdigest()
+        with self._stats_lock:
+            face = self._closed_mouth_cache.get(key)
+            if face is not None:
+                self._closed_mouth_cache.move_to_end(key)
+        rendered = face is None
+
+        if rendered:
+            silent_mel = np.full((1, 80, 16, 1), -hp.max_abs_value, dtype=np.float32)
+            face = self.infer(silent_mel, img_batch[:1])[0]
+            with self._stats_lock:
+                self._closed_mouth_cache[key] = face
+                while len(self._closed_mouth_cache) > self._closed_mouth_cache_size:
+                    self._closed_mouth_cache.popitem(last=False)
+
+        with self._stats_lock:
+            self.frames_generated += int(rendered)
+            self.frames_skipped += len(img_batch) - int(rendered)
+        return np.broadcast_to(face, (len(img_batch),) + face.shape)
+
+    def predict(self, mel_batch, img_batch, audio_embedding=None, static=False):
+        """
+        Generates mouth crops for NHWC batches. When static, i.e. every crop
+        in the batch is the same face, silent windows get the cached closed
+        mouth and only voiced ones run the model. A video avatar's crop
+        changes every frame, so a closed mouth would cost a generator pass
+        anyway; all its windows run the model on their own mel.
+        """
+        if static:
+            silent = self.silent_windows(mel_batch)
+        else:
+            silent = np.zeros(len(mel_batch), dtype=bool)
+        voiced = np.flatnonzero(~silent)
+        pred = np.empty((len(img_batch), 96, 96, 3), dtype=np.float32)
+
+        if silent.any():
+            pred[silent] = self.closed_mouth(img_batch[silent])
+        if len(voiced):
+            if audio_embedding is not None:
+                audio_embedding = audio_embedding[torch.as_tensor(voiced)]
+            pred[voiced] = self.infer(mel_batch[voiced], img_batch[voiced], audio_embedding)
+            with self._stats_lock:
+                self.frames_generated += len(voiced)
+        return pred
+
+    def interpolate(self, key_pred, keys, length):
+        """
+        Fills in the crops between keyframes by linear blending. Blending in
+        the 96x96 crop space assumes the face barely moves between keyframes,
+        which holds for still avatars and talking-head video.
+        """
+        if len(keys) == length:
+            return key_pred
+        pred = np.empty((length,) + key_pred.shape[1:], dtype=np.float32)
+        pred[keys] = key_pred
+        for a, b, pred_a, pred_b in zip(keys, keys[1:], key_pred, key_pred[1:]):
+            for i in range(a + 1, b):
+                t = (i - a) / (b - a)
+                pred[i] = (1 - t) * pred_a + t * pred_b
+        with self._stats_lock:
+            self.frames_interpolated += length - len(keys)
+        return pred
+
+    def stats(self):
+        with self._stats_lock:
+            total = self.frames_generated + self.frames_skipped
+            return {
+                "silence_db": self.silence_db,
+                "frame_stride": self.frame_stride,
+                "frames_generated": self.frames_generated,
+                "frames_skipped": self.frames_skipped,
+                "frames_interpolated": self.frames_interpolated,
+                "skip_ratio": round(self.frames_skipped / max(1, total), 3),
+            }
+
+    def warmup(self, batch_size=128):
+        """Runs one dummy batch through the generator so CPU/GPU kernels are primed."""
+        if self.model is None:
+            self.model = self.load_model(self.checkpoint_path)
+        mel_batch = np.zeros((batch_size, 80, 16, 1), dtype=np.float32)
+        img_batch = np.zeros((batch_size, 96, 96, 6), dtype=np.float32)
+        self.infer(mel_batch, img_batch)
+
+    def video_fps(self, face, fps=25):
+        """Returns the frame rate frames of face will be rendered at, without decoding."""
+        if face.split(".")[1] in ["jpg", "png", "jpeg"]:
+            return fps
+        video_stream = cv2.VideoCapture(face)
+        fps = video_stream.get(cv2.CAP_PROP_FPS)
+        video_stream.release()
+        return fps
+
+    def read_frames(
         self,
         face,
-        audio_file,
-        output_path="output.mp4",
+        fps=25,
         resize_factor=4,
         rotate=False,
         crop=[0, -1, 0, -1],
-        fps=25,
-        mel_step_size=16,
-        wav2lip_batch_size=128,
+        max_frames=None,
     ):
+        """
+        Reads the avatar image, or up to max_frames frames of the avatar video.
+        Videos are decoded by ffmpeg with resize, rotate and crop applied in
+        its filter graph, and decoding stops once max_frames are out.
+        """
         if not os.path.isfile(face):
             raise ValueError("--face argument must be a valid path to video/image file")
 
@@ -241,49 +641,214 @@ class Processor:
 
         else:
             video_stream = cv2.VideoCapture(face)
+            # Coded frame size plus the rotation metadata (phone recordings).
+            # ffmpeg runs with -noautorotate and the rotation is applied in the
+            # filter graph, so the piped frames always match these dimensions
+            video_stream.set(cv2.CAP_PROP_ORIENTATION_AUTO, 0)
             fps = video_stream.get(cv2.CAP_PROP_FPS)
+            width = int(video_stream.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(video_stream.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            orientation = int(video_stream.get(cv2.CAP_PROP_ORIENTATION_META)) % 360
+            video_stream.release()
+
+            # Same geometry as resizing, rotating and slicing each frame in numpy,
+            # on upright frames already converted to BGR like cv2.VideoCapture returns
+            filters = ["format=bgr24"]
+            if orientation in (90, 270):
+                width, height = height, width
+                filters.append("transpose=clock" if orientation == 90 else "transpose=cclock")
+            elif orientation == 180:
+                filters += ["hflip", "vflip"]
+            if resize_factor > 1:
+                width, height = width // resize_factor, height // resize_factor
+                filters.append(f"scale={width}:{height}:flags=bilinear")
+            if rotate:
+                width, height = height, width
+                filters.append("transpose=clock")
+            y1, y2, x1, x2 = crop
+            rows = range(height)[y1 : None if y2 == -1 else y2]
+            cols = range(width)[x1 : None if x2 == -1 else x2]
+            if not rows or not cols:
+                # ffmpeg would otherwise get crop=0:0 and fail with a vague error
+                raise ValueError(
+                    f"crop {crop} leaves no pixels of the {width}x{height} frame "
+                    "(after resize_factor and rotate)"
+                )
+            if len(rows) != height or len(cols) != width:
+                width, height = len(cols), len(rows)
+                filters.append(f"crop={width}:{height}:{cols.start}:{rows.start}")
 
             print("Reading video frames...")
-
+            command = [
+                "ffmpeg", "-loglevel", "error", "-noautorotate",
+                "-i", face, "-vf", ",".join(filters),
+            ]
+            if max_frames is not None:
+                command += ["-frames:v", str(max_frames)]
+            # One output frame per decoded frame, like cv2.VideoCapture
+            command += ["-fps_mode", "passthrough", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+
+            frame_size = width * height * 3
             full_frames = []
-            while 1:
-                still_reading, frame = video_stream.read()
-                if not still_reading:
-                    video_stream.release()
-                    break
-                if resize_factor > 1:
-                    frame = cv2.resize(
-                        frame,
-                        (
-                            frame.shape[1] // resize_factor,
-                            frame.shape[0] // resize_factor,
-                        ),
+            process = subprocess.Popen(command, stdout=subprocess.PIPE)
+            try:
+                while True:
+                    # bytearray so the frames stay writable without another copy
+                    data = bytearray(frame_size)
+                    view = memoryview(data)
+                    filled = 0
+                    # A pipe read can return less than a frame; only EOF ends it
+                    while filled < frame_size:
+                        n = process.stdout.readinto(view[filled:])
+                        if not n:
+                            break
+                        filled += n
+                    view.release()
+                    if filled < frame_size:
+                        break
+                    full_frames.append(
+                        np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
                     )
+            finally:
+                process.stdout.close()
+                process.wait()
+            if process.returncode != 0:
+                raise RuntimeError(f"ffmpeg failed decoding {face}")
 
-                if rotate:
-                    frame = cv2.rotate(frame, cv2.cv2.ROTATE_90_CLOCKWISE)
+        print("Number of frames available for inference: " + str(len(full_frames)))
+        return full_frames, fps
 
-                y1, y2, x1, x2 = crop
-                if x2 == -1:
-                    x2 = frame.shape[1]
-                if y2 == -1:
-                    y2 = frame.shape[0]
+    def get_mel_chunks(self, mel, fps, mel_step_size=16):
+        mel_chunks = []
+        mel_idx_multiplier = 80.0 / fps
+        i = 0
+        while 1:
+            start_idx = int(i * mel_idx_multiplier)
+            if start_idx + mel_step_size > len(mel[0]):
+                mel_chunks.append(mel[:, len(mel[0]) - mel_step_size :])
+                break
+            mel_chunks.append(mel[:, start_idx : start_idx + mel_step_size])
+            i += 1
+        return mel_chunks
 
-                frame = frame[y1:y2, x1:x2]
+    def render(
+        self,
+        full_frames,
+        mel_chunks,
+        face_det_results=None,
+        start_index=0,
+        wav2lip_batch_size=128,
+        audio_embeddings=None,
+        crops_only=False,
+        cache_audio_embeddings=True,
+    ):
+        """
+        Yields output frames with the generated mouth region pasted back, or
+        with crops_only (face box, coords) pairs for compositing elsewhere.
+        audio_embeddings may be passed in when the same audio is rendered onto
+        several avatars; otherwise they are computed for all of mel_chunks first,
+        through the embedding cache unless cache_audio_embeddings is False.
+        """
+        if self.model is None:
+            self.model = self.load_model(self.checkpoint_path)
+            print("Model loaded")
+
+        if audio_embeddings is None:
+            audio_embeddings = self.audio_embeddings(
+                mel_chunks, cache=cache_audio_embeddings
+            )
 
-                full_frames.append(frame)
+        batch_size = wav2lip_batch_size
+        # datagen repeats the first frame's face crop for image avatars
+        static = self.static or len(full_frames) == 1
+        gen = self.datagen(
+            full_frames,
+            mel_chunks,
+            face_det_results,
+            start_index,
+            wav2lip_batch_size,
+            with_frames=not crops_only,
+        )
+
+        offset = 0
+        for img_batch, mel_batch, frames, coords in tqdm(
+            gen, total=int(np.ceil(float(len(mel_chunks)) / batch_size))
+        ):
+            # Every frame_stride-th frame plus the batch's last one runs the model
+            keys = np.arange(0, len(img_batch), self.frame_stride)
+            if keys[-1] != len(img_batch) - 1:
+                keys = np.append(keys, len(img_batch) - 1)
+
+            key_pred = self.predict(
+                mel_batch[keys],
+                img_batch[keys],
+                None if audio_embeddings is None else audio_embeddings[torch.as_tensor(offset + keys)],
+                static,
+            )
+            pred = self.interpolate(key_pred, keys, len(img_batch))
+            offset += len(img_batch)
+            pred = pred * 255.0
 
-        print("Number of frames available for inference: " + str(len(full_frames)))
+            for p, f, c in zip(pred, frames, coords):
+                y1, y2, x1, x2 = c
+                p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
+
+                if crops_only:
+                    yield p, c
+                    continue
+                f[y1:y2, x1:x2] = p
+                yield f
+
+    def run(
+        self,
+        face,
+        audio_file,
+        output_path="output.mp4",
+        resize_factor=4,
+        rotate=False,
+        crop=[0, -1, 0, -1],
+        fps=25,
+        mel_step_size=16,
+        wav2lip_batch_size=128,
+    ):
+        fps = self.video_fps(face, fps)
+
+        if not os.path.exists("temp"):
+            os.mkdir("temp")
 
         if not audio_file.endswith(".wav"):
             print("Extracting raw audio...")
-            command = "ffmpeg -y -i {} -strict -2 {}".format(
-                audio_file, f"{os.path.join('temp','temp.wav')}"
-            )
+            # A file per call, since concurrent requests share this processor
+            fd, wav_path = tempfile.mkstemp(suffix=".wav", dir="temp")
+            os.close(fd)
+            command = "ffmpeg -y -i {} -strict -2 {}".format(audio_file, wav_path)
 
             subprocess.call(command, shell=True)
-            audio_file = os.path.join("temp", "temp.wav")
+            try:
+                self._run_wav(
+                    face, wav_path, output_path, resize_factor, rotate, crop,
+                    fps, mel_step_size, wav2lip_batch_size,
+                )
+            finally:
+                os.remove(wav_path)
+        else:
+            self._run_wav(
+                face, audio_file, output_path, resize_factor, rotate, crop,
+                fps, mel_step_size, wav2lip_batch_size,
+            )
 
+    def _run_wav(
+        self,
+        face,
+        audio_file,
+        output_path,
+        resize_factor,
+        rotate,
+        crop,
+        fps,
+        mel_step_size,
+        wav2lip_batch_size,
+    ):
         wav = audio.load_wav(audio_file, 16000)
         mel = audio.melspectrogram(wav)
         print(mel.shape)
@@ -293,64 +858,39 @@ class Processor:
                 "Mel contains nan! Using a TTS voice? Add a small epsilon noise to the wav file and try again"
             )
 
-        mel_chunks = []
-        mel_idx_multiplier = 80.0 / fps
-        i = 0
-        while 1:
-            start_idx = int(i * mel_idx_multiplier)
-            if start_idx + mel_step_size > len(mel[0]):
-                mel_chunks.append(mel[:, len(mel[0]) - mel_step_size :])
-                break
-            mel_chunks.append(mel[:, start_idx : start_idx + mel_step_size])
-            i += 1
+        mel_chunks = self.get_mel_chunks(mel, fps, mel_step_size)
 
         print("Length of mel chunks: {}".format(len(mel_chunks)))
 
-        full_frames = full_frames[: len(mel_chunks)]
+        # Only decode as much of the video as the audio needs
+        full_frames, fps = self.read_frames(
+            face, fps, resize_factor, rotate, crop, max_frames=len(mel_chunks)
+        )
 
         print("Full Frames before gen : ", len(full_frames))
 
-        batch_size = wav2lip_batch_size
-        gen = self.datagen(full_frames.copy(), mel_chunks)
-
-        for i, (img_batch, mel_batch, frames, coords) in enumerate(
-            tqdm(gen, total=int(np.ceil(float(len(mel_chunks)) / batch_size)))
-        ):
-            if i == 0:
-                model = self.load_model(self.checkpoint_path)
-                print("Model loaded")
-                if not os.path.exists("temp"):
-                    os.mkdir("temp")
-                generated_temp_video_path = os.path.join(
-                    "temp",
-                    f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}_result.avi",
-                )
-                frame_h, frame_w = full_frames[0].shape[:-1]
-                out = cv2.VideoWriter(
-                    generated_temp_video_path,
-                    cv2.VideoWriter_fourcc(*"DIVX"),
-                    fps,
-                    (frame_w, frame_h),
-                )
-
-            img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(
-                self.device
-            )
-            mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(
-                self.device
+        if len(full_frames) == 1:
+            self.run_static(
+                full_frames[0], mel_chunks, audio_file, output_path, fps, wav2lip_batch_size
             )
-
-            with torch.no_grad():
-                pred = model(mel_batch, img_batch)
-
-            pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.0
-
-            for p, f, c in zip(pred, frames, coords):
-                y1, y2, x1, x2 = c
-                p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
-
-                f[y1:y2, x1:x2] = p
-                out.write(f)
+            return
+
+        generated_temp_video_path = os.path.join(
+            "temp",
+            f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}_{uuid.uuid4().hex[:8]}_result.avi",
+        )
+        frame_h, frame_w = full_frames[0].shape[:-1]
+        out = cv2.VideoWriter(
+            generated_temp_video_path,
+            cv2.VideoWriter_fourcc(*"DIVX"),
+            fps,
+            (frame_w, frame_h),
+        )
+
+        for f in self.render(
+            full_frames, mel_chunks, wav2lip_batch_size=wav2lip_batch_size
+        ):
+            out.write(f)
 
         out.release()
 
@@ -364,6 +904,352 @@ class Processor:
         # Write the combined video to a new file
         video_clip.write_videofile(output_path, codec="libx264", audio_codec="aac")
 
+    def overlay_args(self, background_path, crop_size, position, fps):
+        """
+        ffmpeg input and filter arguments that composite a raw bgr24 stream of
+        face-box crops (read from stdin) onto a still background image.
+        The background is decoded once and repeated by the loop filter; the
+        composited video is available as [v] and audio as input 2.
+        """
+        crop_w, crop_h = crop_size
+        x, y = position
+        return [
+            "-framerate", str(fps), "-i", background_path,
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{crop_w}x{crop_h}", "-r", str(fps), "-i", "pipe:0",
+        ], [
+            "-filter_complex",
+            f"[0:v]loop=loop=-1:size=1[bg];[bg][1:v]overlay=x={x}:y={y}:shortest=1,"
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2[v]",
+            "-map", "[v]", "-map", "2:a",
+        ]
+
+    def write_background(self, frame):
+        """
+        Returns the path of a PNG of the still avatar for ffmpeg to overlay the
+        crops on. Each image is written once and reused by later requests;
+        files of avatars that fall out of the small LRU are deleted.
+        """
+        key = self.still_key(frame)
+        background_dir = os.path.join("temp", "backgrounds")
+        background_path = os.path.join(background_dir, f"{key}.png")
+        with self._still_face_lock:
+            if key in self._backgrounds:
+                self._backgrounds.move_to_end(key)
+                return background_path
+
+        # PNG keeps the background lossless until the single final encode;
+        # written under a unique name so concurrent first requests don't collide
+        os.makedirs(background_dir, exist_ok=True)
+        tmp_path = os.path.join(background_dir, f"{key}.{uuid.uuid4()}.png")
+        cv2.imwrite(tmp_path, frame)
+        os.replace(tmp_path, background_path)
+
+        with self._still_face_lock:
+            self._backgrounds[key] = background_path
+            while len(self._backgrounds) > self._backgrounds_size:
+                _, evicted = self._backgrounds.popitem(last=False)
+                if os.path.exists(evicted):
+                    os.remove(evicted)
+        return background_path
+
+    def run_static(self, frame, mel_chunks, audio_file, output_path, fps, wav2lip_batch_size=128):
+        """
+        Renders a still-image avatar by streaming only the face-box crops to
+        ffmpeg, which overlays them on the image and muxes the audio, so the
+        per-frame cost scales with the face box instead of the full image.
+        """
+        face_det_results = self.detect_faces([frame])
+        y1, y2, x1, x2 = face_det_results[0][1]
+        background_path = self.write_background(frame)
+
+        input_args, filter_args = self.overlay_args(
+            background_path, (x2 - x1, y2 - y1), (x1, y1), fps
+        )
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            *input_args, "-i", audio_file,
+            *filter_args,
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac",
+            "-shortest", output_path,
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            for crop, _ in self.render(
+                [frame],
+                mel_chunks,
+                face_det_results,
+                wav2lip_batch_size=wav2lip_batch_size,
+                crops_only=True,
+            ):
+                process.stdin.write(crop.tobytes())
+            process.stdin.close()
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed writing {output_path}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+
+    def stream_encoder_command(self, frame_size, fps, sample_rate, audio_fd, background=None):
+        """
+        ffmpeg command muxing a raw bgr24 frame stream (stdin) and raw float
+        audio (file descriptor audio_fd) into one continuous MPEG-TS stream.
+        With background=(image_path, (x, y)), frames are face-box crops that
+        get overlaid on that still image.
+        """
+        frame_w, frame_h = frame_size
+        # Raw PCM needs no probing; without this ffmpeg waits for ~1 s of input
+        audio_args = [
+            "-fflags", "+nobuffer", "-probesize", "32", "-analyzeduration", "0",
+            "-f", "f32le", "-ar", str(sample_rate), "-ac", "1", "-i", f"pipe:{audio_fd}",
+        ]
+        if background is None:
+            video_args = [
+                "-f", "rawvideo", "-pix_fmt", "bgr24",
+                "-s", f"{frame_w}x{frame_h}", "-r", str(fps), "-i", "pipe:0",
+                *audio_args,
+                "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            ]
+        else:
+            background_path, position = background
+            input_args, filter_args = self.overlay_args(
+                background_path, (frame_w, frame_h), position, fps
+            )
+            video_args = [*input_args, *audio_args, *filter_args]
+        return [
+            "ffmpeg", "-y", "-loglevel", "error",
+            *video_args,
+            "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency",
+            # One audio encoder for the whole reply, so there is no encoder
+            # priming or padding (and no audible gap) between rendered batches
+            "-pix_fmt", "yuv420p", "-c:a", "aac",
+            # Write each packet out immediately instead of buffering the muxer
+            "-flush_packets", "1",
+            "-f", "mpegts", "pipe:1",
+        ]
+
+    def run_stream(
+        self,
+        face,
+        audio_chunks,
+        sample_rate=24000,
+        resize_factor=4,
+        rotate=False,
+        crop=[0, -1, 0, -1],
+        fps=25,
+        mel_step_size=16,
+        wav2lip_batch_size=128,
+        min_segment_frames=10,
+        read_size=65536,
+    ):
+        """
+        Lip-syncs audio that is still being synthesized.
+
+        audio_chunks is an iterable of float waveforms at sample_rate, e.g. XTTS
+        streaming output. Frames are rendered in batches of at least
+        min_segment_frames as soon as their mel window is covered by received
+        audio, and one ffmpeg process muxes them with the audio into an MPEG-TS
+        stream whose bytes are yielded as they are written.
+        """
+        full_frames, fps = self.read_frames(face, fps, resize_factor, rotate, crop)
+        face_det_results = self.detect_faces(full_frames)
+
+        if len(full_frames) == 1:
+            # Still image: send only face-box crops and let ffmpeg overlay them
+            if not os.path.exists("temp"):
+                os.mkdir("temp")
+            y1, y2, x1, x2 = face_det_results[0][1]
+            background = (self.write_background(full_frames[0]), (x1, y1))
+            yield from self._stream(
+                full_frames, face_det_results, audio_chunks, sample_rate, fps,
+                mel_step_size, wav2lip_batch_size, min_segment_frames, read_size,
+                (x2 - x1, y2 - y1), background,
+            )
+        else:
+            frame_h, frame_w = full_frames[0].shape[:-1]
+            yield from self._stream(
+                full_frames, face_det_results, audio_chunks, sample_rate, fps,
+                mel_step_size, wav2lip_batch_size, min_segment_frames, read_size,
+                (frame_w, frame_h),
+            )
+
+    def _stream(
+        self,
+        full_frames,
+        face_det_results,
+        audio_chunks,
+        sample_rate,
+        fps,
+        mel_step_size,
+        wav2lip_batch_size,
+        min_segment_frames,
+        read_size,
+        frame_size,
+        background=None,
+    ):
+        audio_read, audio_write = os.pipe()
+        try:
+            process = subprocess.Popen(
+                self.stream_encoder_command(frame_size, fps, sample_rate, audio_read, background),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                pass_fds=(audio_read,),
+            )
+        except BaseException:
+            os.close(audio_write)
+            raise
+        finally:
+            os.close(audio_read)
+
+        # Audio gets its own writer so ffmpeg never waits on one input while
+        # the renderer is blocked writing the other
+        audio_pipe = os.fdopen(audio_write, "wb")
+        audio_queue = queue.Queue()
+        stop = threading.Event()
+        errors = []
+
+        def _write_audio():
+            try:
+                while True:
+                    wav = audio_queue.get()
+                    if wav is None:
+                        break
+                    audio_pipe.write(wav.tobytes())
+                    audio_pipe.flush()
+            except OSError as e:
+                if not stop.is_set():
+                    errors.append(e)
+            finally:
+                try:
+                    audio_pipe.close()
+                except OSError:
+                    pass
+
+        def _render():
+            chunks = iter(audio_chunks)
+            try:
+                for wav, mel_chunks, start_index in self._stream_windows(
+                    chunks, sample_rate, fps, mel_step_size, min_segment_frames, stop
+                ):
+                    if wav is not None:
+                        audio_queue.put(wav)
+                    if not mel_chunks:
+                        continue
+                    for f in self.render(
+                        full_frames,
+                        mel_chunks,
+                        face_det_results,
+                        start_index,
+                        wav2lip_batch_size,
+                        crops_only=background is not None,
+                        # Segments of a live stream never repeat, so keep them
+                        # out of the LRU that serves whole-clip requests
+                        cache_audio_embeddings=False,
+                    ):
+                        if background is not None:
+                            f = f[0]
+                        process.stdin.write(f.tobytes())
+                    process.stdin.flush()
+            except Exception as e:
+                if not stop.is_set():
+                    errors.append(e)
+            finally:
+                audio_queue.put(None)
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+                # Stops the XTTS stream too if this request was abandoned
+                if hasattr(chunks, "close"):
+                    chunks.close()
+
+        audio_writer = threading.Thread(target=_write_audio, name="lipsync-audio", daemon=True)
+        renderer = threading.Thread(target=_render, name="lipsync-render", daemon=True)
+        audio_writer.start()
+        renderer.start()
+
+        completed = False
+        try:
+            while True:
+                data = os.read(process.stdout.fileno(), read_size)
+                if not data:
+                    break
+                yield data
+            completed = True
+        finally:
+            process.stdout.close()
+            if not completed:
+                # The client went away; stop rendering and synthesizing
+                stop.set()
+                process.kill()
+            process.wait()
+            # A renderer stuck in a long batch is left to finish on its own
+            renderer.join(timeout=10)
+            audio_writer.join(timeout=10)
+
+        if errors:
+            raise errors[0]
+        if process.returncode != 0:
+            raise RuntimeError("ffmpeg failed encoding the lip-sync stream")
+
+    def _stream_windows(self, chunks, sample_rate, fps, mel_step_size, min_segment_frames, stop):
+        """
+        Yields (wav, mel_chunks, start_index) per received audio chunk: the
+        chunk's samples and the mel windows of the frames it completes, once
+        at least min_segment_frames are ready. The mel is computed
+        incrementally, keeping only the frames later windows still need.
+        """
+        mel_idx_multiplier = 80.0 / fps
+        mel_stream = audio.MelStream(sample_rate)
+        mel = np.zeros((hp.num_mels, 0))
+        mel_start = 0  # mel frame index of mel[:, 0]
+        rendered = 0
+        received = False
+
+        def window(start):
+            return mel[:, start - mel_start : start - mel_start + mel_step_size]
+
+        for chunk in chunks:
+            if stop.is_set():
+                return
+            wav = np.asarray(chunk, dtype=np.float32).reshape(-1)
+            received = received or len(wav) > 0
+            mel = np.concatenate((mel, mel_stream.push(wav)), axis=1)
+
+            # Frames whose whole mel window has been computed
+            ready = rendered
+            while int(ready * mel_idx_multiplier) + mel_step_size <= mel_start + mel.shape[1]:
+                ready += 1
+            if ready - rendered < min_segment_frames:
+                yield wav, [], rendered
+                continue
+
+            mel_chunks = [window(int(i * mel_idx_multiplier)) for i in range(rendered, ready)]
+            yield wav, mel_chunks, rendered
+            rendered = ready
+
+            # Keep at least one window for the tail, as get_mel_chunks ends on one
+            keep_from = min(int(rendered * mel_idx_multiplier), mel_start + mel.shape[1] - mel_step_size)
+            if keep_from > mel_start:
+                mel = mel[:, keep_from - mel_start :]
+                mel_start = keep_from
+
+        if not received:
+            return
+        mel = np.concatenate((mel, mel_stream.push(np.zeros(0, dtype=np.float32), last=True)), axis=1)
+        # The remaining windows, ending on the last full one like get_mel_chunks
+        total = mel_start + mel.shape[1]
+        mel_chunks = []
+        i = rendered
+        while True:
+            start = int(i * mel_idx_multiplier)
+            if start + mel_step_size > total:
+                mel_chunks.append(mel[:, max(0, total - mel_step_size - mel_start) :])
+                break
+            mel_chunks.append(window(start))
+            i += 1
+        yield None, mel_chunks, rendered
+
 
 if __name__ == "__main__":
     start_time = time.time()
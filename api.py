@@ -4,13 +4,6 @@ import torch
 import torchaudio
 import re
 
-from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import Xtts
-from TTS.utils.generic_utils import get_user_data_dir
-from TTS.utils.manage import ModelManager
-from transformers import MarianMTModel, MarianTokenizer
-from faster_whisper import WhisperModel
-from transformers import AutoTokenizer
 import json
 import torch
 from torch.nn import functional as F
@@ -30,11 +23,19 @@ from flask import (
     render_template,
     Response,
     send_from_directory,
+    stream_with_context,
 )
 from flask_cors import CORS
 
 from dotenv import load_dotenv
 
+from latent_store import SpeakerLatentStore
+from tts_cache import TTSCache
+import audio_stream
+import transcription
+from model_registry import registry
+import speech
+
 load_dotenv()
 
 weights_relative_path = os.getenv("MODEL_DIR")
@@ -48,59 +49,103 @@ CORS(app)  # Enable CORS for all routes
 FILE_DIRECTORY = os.path.join(app.root_path, "mp3")
 os.makedirs(FILE_DIRECTORY, exist_ok=True)
 
-# Initialize the Whisper model #large-v3 seems to have a problem
-whisper_model = WhisperModel(f"{weights_relative_path}/faster-whisper-v3")
+# Use this if there is no user_id sent
+SPEAKER_WAV_PATH = "trump.wav"  # Update this path
+
+# Avatars (face image or video) and voices (speaker reference) selectable by id
+AVATARS = {
+    "trump": "trump.jpg",
+    "trump1": "trump1.jpeg",
+    "trump2": "trump2.jpeg",
+    "biden": "biden2.jpeg",
+}
+VOICES = {
+    "trump": SPEAKER_WAV_PATH,
+}
+
+# Speaker encoding latents, kept in a bounded LRU and persisted across restarts
+latent_store = SpeakerLatentStore(
+    cache_dir=os.getenv("LATENT_CACHE_DIR", os.path.join(app.root_path, "latents")),
+    max_entries=int(os.getenv("LATENT_CACHE_SIZE", "16")),
+)
+
+# Whisper worker pool; concurrent short uploads share batched encoder passes
+transcriber = transcription.TranscriptionService(
+    lambda: registry.get("whisper"),
+    num_workers=int(os.getenv("WHISPER_NUM_WORKERS", "1")),
+    max_batch_size=int(os.getenv("WHISPER_BATCH_SIZE", "8")),
+    max_wait_ms=int(os.getenv("WHISPER_BATCH_WAIT_MS", "20")),
+)
+
+# Transcripts by upload content hash, so client retries skip ASR
+transcript_cache = transcription.TranscriptCache(
+    max_entries=int(os.getenv("TRANSCRIPT_CACHE_SIZE", "256")),
+)
 
-# Set environment variable for Coqui TTS agreement
-os.environ["COQUI_TOS_AGREED"] = "1"
+# Synthesized waveforms of repeated phrases, size-bounded on disk
+tts_cache = TTSCache(
+    cache_dir=os.getenv("TTS_CACHE_DIR", os.path.join(app.root_path, "tts_cache")),
+    max_bytes=int(os.getenv("TTS_CACHE_MB", "512")) * 1024 * 1024,
+)
 
-config_path = f"{weights_relative_path}/coqui-xtts-v2/config.json"
 
-# Check if the config file exists after attempting to download
-if os.path.exists(config_path):
-    print("Model config file found. Proceeding with model initialization.")
+def warmup_models():
+    # Precompute speaker latents so the first request skips extraction
+    xtts_model = registry.get("xtts")
+    latent_store.precompute(xtts_model, [SPEAKER_WAV_PATH])
 
-    # Initialize the model from the configuration
-    config = XttsConfig()
-    config.load_json(config_path)
-    xtts_model = Xtts.init_from_config(config)
-    xtts_model.load_checkpoint(
-        config,
-        checkpoint_path=f"{weights_relative_path}/coqui-xtts-v2/model.pth",
-        vocab_path=f"{weights_relative_path}/coqui-xtts-v2/vocab.json",
-        eval=True,
-        use_deepspeed=True,
+    # One dummy transcription, one short TTS and one Wav2Lip batch
+    segments, _ = registry.get("whisper").transcribe(
+        np.zeros(16000, dtype=np.float32), beam_size=1
     )
-    print("CUDA Available:", torch.cuda.is_available())
+    list(segments)
+    gpt_cond_latent, speaker_embedding = latent_store.get(xtts_model, SPEAKER_WAV_PATH)
+    if getattr(xtts_model, "prefix_cache", None) is not None:
+        xtts_model.prefix_cache.precompute(gpt_cond_latent.to(xtts_model.device))
+    xtts_model.inference("Hello.", "en", gpt_cond_latent, speaker_embedding)
+    registry.get("wav2lip").warmup()
 
-    xtts_model.cuda()  # Use CUDA if available, else consider .to("cpu")
 
-    print("Model loaded successfully.")
-else:
-    raise FileNotFoundError(f"Model configuration file not found at: {config_path}")
+# Load and warm models off the main thread so the server binds its port immediately
+registry.load_in_background(["whisper", "xtts", "wav2lip"], warmup=warmup_models)
 
-# Dictionary to store speaker encoding latents for reuse
-speaker_latents_cache = {}
-# Use this if there is no user_id sent
-SPEAKER_WAV_PATH = "trump.wav"  # Update this path
+def tts_params(xtts_model, **params):
+    # Defaults match the TTS API; callers override individual settings
+    return {
+        **speech.sampling_params(xtts_model),
+        "enable_text_splitting": True,
+        **params,
+    }
 
-from TTS.api import TTS
-tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2", gpu=True)
-def test_xtts(text, language):
-    # tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2", gpu=True)
 
+def synthesize(text, language, speaker_wav_path=SPEAKER_WAV_PATH, **params):
+    """
+    Returns the float32 waveform for text, taken from the TTS cache when the same
+    normalized text, language, speaker and sampling params were synthesized before.
+    """
+    xtts_model = registry.get("xtts")
+    params = tts_params(xtts_model, **params)
+    key = tts_cache.key(text, language, latent_store.key(speaker_wav_path), params)
+    wav = tts_cache.get(key)
+    if wav is None:
+        gpt_cond_latent, speaker_embedding = latent_store.get(xtts_model, speaker_wav_path)
+        out = xtts_model.inference(
+            text, language, gpt_cond_latent, speaker_embedding, **params
+        )
+        wav = np.asarray(out["wav"], dtype=np.float32)
+        tts_cache.put(key, wav)
+    return wav
+
+
+def test_xtts(text, language, speaker_wav_path=SPEAKER_WAV_PATH):
     if not os.path.exists("wavs"):
         os.mkdir("wavs")
 
     output_path = f"wavs/{uuid.uuid4()}.wav"
 
-    # generate speech by cloning a voice using default settings
-    tts.tts_to_file(text=text,
-                    file_path=output_path,
-                    speaker_wav=SPEAKER_WAV_PATH,
-                    language=language,
-                    split_sentences=True
-                    )
+    # generate speech by cloning a voice using the model's default sampling settings
+    wav = synthesize(text, language, speaker_wav_path)
+    torchaudio.save(output_path, torch.from_numpy(wav).unsqueeze(0), speech.XTTS_SAMPLE_RATE)
     return output_path
 
 def speed_up_wav(input_wav_path, output_wav_path, speed_factor=1.5):
@@ -114,37 +159,21 @@ def speed_up_wav(input_wav_path, output_wav_path, speed_factor=1.5):
     sped_up_audio.export(output_wav_path, format="wav")
 
 def generate_audio_mp3(prompt, language, speaker_wav_path):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    xtts_model.to(device)
-
     prompt = re.sub("([^\x00-\x7F]|\w)(\.|\。|\?)", r"\1 \2\2", prompt)
     print("prompt: ",prompt)
-    # Check if speaker latents are already calculated
-    if speaker_wav_path in speaker_latents_cache:
-        gpt_cond_latent, speaker_embedding = speaker_latents_cache[speaker_wav_path]
-    else:
-        start_time_latents = time.time()
-        gpt_cond_latent, speaker_embedding = xtts_model.get_conditioning_latents(
-            audio_path=speaker_wav_path,
-            gpt_cond_len=30,
-            gpt_cond_chunk_len=4,
-            max_ref_length=60,
-        )
-        latents_time = time.time() - start_time_latents
-        # Cache the latents for future use
-        speaker_latents_cache[speaker_wav_path] = (gpt_cond_latent, speaker_embedding)
 
     start_time_inference = time.time()
 
     if language == "zh":
         language = "zh-cn"
-    out = xtts_model.inference(
+    # Speaker latents and repeated prompts are both served from their caches
+    wav = synthesize(
         prompt,
         language,
-        gpt_cond_latent,
-        speaker_embedding,
+        speaker_wav_path,
         repetition_penalty=1.0,
         temperature=0.5,
+        enable_text_splitting=False,
     )
     inference_time = time.time() - start_time_inference
 
@@ -152,8 +181,7 @@ def generate_audio_mp3(prompt, language, speaker_wav_path):
     output_filename = os.path.join(FILE_DIRECTORY, f"out_{output_fileid}.wav")
     output_filename_fast = os.path.join(FILE_DIRECTORY, f"out_{output_fileid}_fast.wav")
 
-    print(out)
-    torchaudio.save(output_filename, torch.tensor(out["wav"]).unsqueeze(0), 24000)
+    torchaudio.save(output_filename, torch.from_numpy(wav).unsqueeze(0), speech.XTTS_SAMPLE_RATE)
     try:
 
         #speed_up_wav(output_filename, output_filename_fast, speed_factor=1.5)
@@ -202,8 +230,6 @@ def check_language_existence(lang):
         return False
 
 
-from Wav2Lip import Processor
-
 def process_wav2lip(face_path, audio_path, output_path):
     """
     Processes a video or image and audio using Wav2Lip to produce a video with the audio's lip movements.
@@ -213,9 +239,65 @@ def process_wav2lip(face_path, audio_path, output_path):
     audio_path (str): Path to the audio file (wav format).
     output_path (str): Path where the output video should be saved.
     """
-    processor = Processor()
+    processor = registry.get("wav2lip")
     processor.run(face_path, audio_path, output_path)
 
+
+def cache_stream(xtts_model, key, text, language, speaker_wav_path):
+    """Streams XTTS chunks and stores the complete waveform once decoding finishes."""
+    gpt_cond_latent, speaker_embedding = latent_store.get(xtts_model, speaker_wav_path)
+    chunks = []
+    for chunk in speech.synthesize_stream(
+        xtts_model, text, language, gpt_cond_latent, speaker_embedding
+    ):
+        chunks.append(chunk)
+        yield chunk
+    if chunks:
+        tts_cache.put(key, np.concatenate(chunks))
+
+
+def reply_audio_chunks(text, language, speaker_wav_path=SPEAKER_WAV_PATH):
+    """Returns the reply waveform as an iterable of chunks, cached or freshly streamed."""
+    xtts_model = registry.get("xtts")
+    params = tts_params(xtts_model)
+    key = tts_cache.key(text, language, latent_store.key(speaker_wav_path), params)
+    wav = tts_cache.get(key)
+    if wav is not None:
+        return [wav]
+    return cache_stream(xtts_model, key, text, language, speaker_wav_path)
+
+
+def stream_wav2lip(face_path, text, language, speaker_wav_path=SPEAKER_WAV_PATH):
+    """
+    Yields MPEG-TS video segments for the reply while XTTS is still decoding it,
+    so the first segment is sent after one audio chunk rather than the whole clip.
+    """
+    audio_chunks = reply_audio_chunks(text, language, speaker_wav_path)
+    processor = registry.get("wav2lip")
+    yield from processor.run_stream(
+        face_path, audio_chunks, sample_rate=speech.XTTS_SAMPLE_RATE
+    )
+
+def lipsync_response(face_path, text, language, speaker_wav_path, stream):
+    """Speaks text with XTTS and lip-syncs it onto the avatar, as an mp4 or a TS stream."""
+    if stream:
+        # Send video segments as they are rendered instead of one finished mp4
+        return Response(
+            stream_with_context(
+                stream_wav2lip(face_path, text, language, speaker_wav_path)
+            ),
+            mimetype="video/mp2t",
+        )
+
+    audio_path = test_xtts(text, language, speaker_wav_path)
+
+    if not os.path.exists("mp4"):
+        os.mkdir("mp4")
+
+    output_path = f"mp4/output_{uuid.uuid4()}.mp4"
+    process_wav2lip(face_path, audio_path, output_path)
+    return send_file(output_path, mimetype='video/mp4')
+
 import base64
 
 def base64_to_mp3(base64_string, output_filename):
@@ -233,9 +315,110 @@ def index():
     return send_from_directory(app.static_folder, 'index.html')
 
 
+@app.route("/healthz")
+def healthz():
+    # Liveness only: the process is up and serving, models may still be loading
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    status = registry.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/models/memory")
+def models_memory():
+    return jsonify(registry.memory_report())
+
+
+@app.route("/asr/stats")
+def asr_stats():
+    return jsonify(transcriber.stats())
+
+
+@app.route("/lipsync/stats")
+def lipsync_stats():
+    if not registry.is_loaded("wav2lip"):
+        return jsonify({"error": "Models are still loading"}), 503
+    return jsonify(registry.get("wav2lip").stats())
+
+
+@app.route("/tts/cache")
+def tts_cache_stats():
+    return jsonify(tts_cache.stats())
+
+
+# Speech only, streamed as binary audio while it is being synthesized
+@app.route("/speech_stream", methods=["POST"])
+def speech_stream():
+    if not registry.ready():
+        return jsonify({"error": "Models are still loading"}), 503
+    data = request.get_json(silent=True) or request.form
+    text = data.get("text", "")
+    language = data.get("language", "en")
+    stream_format = data.get("format", "ogg")
+    if not text.strip():
+        return jsonify({"error": "No text"}), 400
+    if not check_language_existence(language):
+        return jsonify({"error": f"Unsupported language: {language}"}), 400
+    if stream_format not in audio_stream.STREAM_FORMATS:
+        return jsonify({"error": f"Unsupported format: {stream_format}"}), 400
+    if language == "zh":
+        language = "zh-cn"
+
+    chunks = reply_audio_chunks(text, language)
+    return Response(
+        stream_with_context(
+            audio_stream.encode_stream(chunks, speech.XTTS_SAMPLE_RATE, stream_format)
+        ),
+        mimetype=audio_stream.mimetype(stream_format),
+    )
+
+
+# Text - Speech - Lip-sync, for clients that already have the reply text
+@app.route("/speak", methods=["POST"])
+def speak():
+    if not registry.ready():
+        return jsonify({"error": "Models are still loading"}), 503
+    start_time = time.time()
+    data = request.get_json(silent=True) or request.form
+    text = data.get("text", "")
+    language = data.get("language", "en")
+    avatar_id = data.get("avatar_id", "trump")
+    voice_id = data.get("voice_id", "trump")
+    if not text.strip():
+        return jsonify({"error": "No text"}), 400
+    if not check_language_existence(language):
+        return jsonify({"error": f"Unsupported language: {language}"}), 400
+    if avatar_id not in AVATARS:
+        return jsonify({"error": f"Unknown avatar: {avatar_id}"}), 400
+    if voice_id not in VOICES:
+        return jsonify({"error": f"Unknown voice: {voice_id}"}), 400
+    if language == "zh":
+        language = "zh-cn"
+
+    try:
+        response = lipsync_response(
+            AVATARS[avatar_id],
+            text,
+            language,
+            VOICES[voice_id],
+            stream=request.args.get("stream") == "1",
+        )
+        print("Total time:", time.time() - start_time)
+        return response
+
+    except Exception as e:
+        print(e)
+        return jsonify({"error": str(e)}), 500
+
+
 # Transcribe - Translate - Speech  with additional info:
 @app.route("/transcribe_speech_wav2lips", methods=["POST"])
 def transcribe_speech_wav2lips():
+    if not registry.ready():
+        return jsonify({"error": "Models are still loading"}), 503
     start_time =time.time()
     if "file" not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -243,31 +426,19 @@ def transcribe_speech_wav2lips():
     if file.filename == "":
         return jsonify({"error": "No selected file"}), 400
 
-    # Generate random filenames for input and output files
-    fileid = f"{uuid.uuid4()}"
-    input_filename = os.path.join(FILE_DIRECTORY, f"in_{fileid}.mp3")
-    file.save(input_filename)
+    word_timestamps = request.args.get("word_timestamps") == "1"
 
     try:
-        segments, info = whisper_model.transcribe(
-            audio=input_filename,
-            beam_size=1,
-            temperature=0,
-            word_timestamps=True,
-            condition_on_previous_text=False,
-            no_speech_threshold=0.1,
-        )
-        given_lang = info.language
-
-
-        segment_list = []
-        for segment in segments:
-            segment_dict = {
-                "start": "%.2f" % segment.start,
-                "end": "%.2f" % segment.end,
-                "text": segment.text,
-            }
-            segment_list.append(segment_dict)
+        # Decode the upload in memory and reuse the transcript of identical uploads
+        data = file.read()
+        cache_key = transcript_cache.key(data, word_timestamps)
+        result = transcript_cache.get(cache_key)
+        if result is None:
+            audio = transcription.trim_silence(transcription.decode_upload(data))
+            result = transcriber.transcribe(audio, word_timestamps=word_timestamps)
+            transcript_cache.put(cache_key, result)
+        given_lang = result["language"]
+        segment_list = result["segments"]
 
         joined_text = " ".join([segment["text"] for segment in segment_list])
         # print(joined_text)
@@ -281,15 +452,16 @@ def transcribe_speech_wav2lips():
         # mp3_filename = f"input_{fileid}.mp3"
         # base64_to_mp3(mp3_data, mp3_filename)
 
-        audio_path = test_xtts(joined_text, "en")
-
-        if not os.path.exists("mp4"):
-            os.mkdir("mp4")
-
-        process_wav2lip("trump.jpg", audio_path, f"mp4/output_{fileid}.mp4")
+        response = lipsync_response(
+            "trump.jpg",
+            joined_text,
+            "en",
+            SPEAKER_WAV_PATH,
+            stream=request.args.get("stream") == "1",
+        )
         end_time =time.time()
         print("Total time:",end_time-start_time)
-        return send_file(f"mp4/output_{fileid}.mp4", mimetype='video/mp4')
+        return response
 
     except Exception as e:
         # os.remove(os.path.join(FILE_DIRECTORY, input_filename))
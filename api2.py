@@ -4,13 +4,8 @@ import torch
 import torchaudio
 import re
 
-from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import Xtts
 from TTS.utils.generic_utils import get_user_data_dir
 from TTS.utils.manage import ModelManager
-from transformers import MarianMTModel, MarianTokenizer
-from faster_whisper import WhisperModel
-from transformers import AutoTokenizer
 import json
 from torch.nn import functional as F
 import numpy as np
@@ -29,9 +24,15 @@ from flask import (
     render_template,
     Response,
     send_from_directory,
+    stream_with_context,
 )
 from flask_cors import CORS
 
+from latent_store import SpeakerLatentStore
+from model_registry import registry, load_whisper, load_xtts
+import audio_stream
+import speech
+
 app = Flask(__name__, static_url_path='/static', static_folder='static')
 CORS(app)  # Enable CORS for all routes
 
@@ -45,71 +46,94 @@ os.makedirs(FILE_DIRECTORY, exist_ok=True)
 
 # Initialize the Whisper model
 whisper_model_name = "large-v2"  # Changed to a stable version
-whisper_model = WhisperModel(whisper_model_name, device="cuda", compute_type="auto", num_workers=5)
-
-# Set environment variable for Coqui TTS agreement
-os.environ["COQUI_TOS_AGREED"] = "1"
 
 # Define the model name and path
 xtts_model_name = "tts_models/multilingual/multi-dataset/xtts_v2"
 
-model_manager = ModelManager()
 
-# Check if the model directory exists, if not, attempt to download the model
-model_path = os.path.join(get_user_data_dir("tts"), xtts_model_name.replace("/", "--"))
-config_path = os.path.join(model_path, "config.json")
+def download_xtts_model():
+    # Check if the model directory exists, if not, attempt to download the model
+    model_path = os.path.join(get_user_data_dir("tts"), xtts_model_name.replace("/", "--"))
 
-if not os.path.exists(model_path):
-    print(f"Model directory not found. Attempting to download the model to: {model_path}")
-    model_manager.download_model(xtts_model_name)
-else:
-    print(f"Model directory already exists: {model_path}")
+    if not os.path.exists(model_path):
+        print(f"Model directory not found. Attempting to download the model to: {model_path}")
+        ModelManager().download_model(xtts_model_name)
+    else:
+        print(f"Model directory already exists: {model_path}")
+    return model_path
 
-# Check if the config file exists after attempting to download
-if os.path.exists(config_path):
-    print("Model config file found. Proceeding with model initialization.")
-    
-    # Initialize the model from the configuration
-    config = XttsConfig()
-    config.load_json(config_path)
-    xtts_model = Xtts.init_from_config(config)
-    xtts_model.load_checkpoint(
-        config,
-        checkpoint_path=os.path.join(model_path, "model.pth"),
-        vocab_path=os.path.join(model_path, "vocab.json"),
-        checkpoint_dir=model_path,
-        eval=True,
-        use_deepspeed=False
-    )
-    print("CUDA Available:", torch.cuda.is_available())
 
-    xtts_model.cuda()  # Use CUDA if available, else consider .to("cpu")
-    
-    print("Model loaded successfully.")
-else:
-    raise FileNotFoundError(f"Model configuration file not found at: {config_path}")
+# This server pulls its models from the hub instead of MODEL_DIR, but still
+# shares a single loaded instance of each through the registry
+registry.register(
+    "whisper",
+    lambda: load_whisper(whisper_model_name, device="cuda", compute_type="auto", num_workers=5),
+)
+registry.register(
+    "xtts",
+    lambda: load_xtts(download_xtts_model(), use_deepspeed=False),
+)
 
 SPEAKER_WAV_PATH = "trump.wav"  # Update this path
 
-from TTS.api import TTS
-tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2", gpu=True)
+# Avatars (face image or video) and voices (speaker reference) selectable by id
+AVATARS = {
+    "trump": "trump.jpg",
+    "trump1": "trump1.jpeg",
+    "trump2": "trump2.jpeg",
+    "biden": "biden2.jpeg",
+}
+VOICES = {
+    "trump": SPEAKER_WAV_PATH,
+}
+
+# Speaker encoding latents, kept in a bounded LRU and persisted across restarts
+latent_store = SpeakerLatentStore(
+    cache_dir=os.getenv("LATENT_CACHE_DIR", os.path.join(app.root_path, "latents")),
+    max_entries=int(os.getenv("LATENT_CACHE_SIZE", "16")),
+)
+
+
+def warmup_models():
+    # Precompute speaker latents so the first request skips extraction
+    xtts_model = registry.get("xtts")
+    latent_store.precompute(xtts_model, [SPEAKER_WAV_PATH])
+
+    # One dummy transcription, one short TTS and one Wav2Lip batch
+    segments, _ = registry.get("whisper").transcribe(
+        np.zeros(16000, dtype=np.float32), beam_size=1
+    )
+    list(segments)
+    gpt_cond_latent, speaker_embedding = latent_store.get(xtts_model, SPEAKER_WAV_PATH)
+    xtts_model.inference("Hello.", "en", gpt_cond_latent, speaker_embedding)
+    registry.get("wav2lip").warmup()
+
 
-# Cache for speaker latents
-speaker_latents_cache = {}
+# Load and warm models off the main thread so the server binds its port immediately
+registry.load_in_background(["whisper", "xtts", "wav2lip"], warmup=warmup_models)
 
-def test_xtts(text, language):
+def test_xtts(text, language, speaker_wav_path=SPEAKER_WAV_PATH):
     if not os.path.exists("wavs"):
         os.mkdir("wavs")
 
     output_path = f"wavs/{uuid.uuid4()}.wav"
 
-    # generate speech by cloning a voice using default settings
-    tts.tts_to_file(text=text,
-                    file_path=output_path,
-                    speaker_wav=SPEAKER_WAV_PATH,
-                    language=language,
-                    split_sentences=True
-                    )
+    # generate speech by cloning a voice using the model's default sampling settings
+    xtts_model = registry.get("xtts")
+    gpt_cond_latent, speaker_embedding = latent_store.get(xtts_model, speaker_wav_path)
+    out = xtts_model.inference(
+        text,
+        language,
+        gpt_cond_latent,
+        speaker_embedding,
+        temperature=xtts_model.config.temperature,
+        length_penalty=xtts_model.config.length_penalty,
+        repetition_penalty=xtts_model.config.repetition_penalty,
+        top_k=xtts_model.config.top_k,
+        top_p=xtts_model.config.top_p,
+        enable_text_splitting=True,
+    )
+    torchaudio.save(output_path, torch.tensor(out["wav"]).unsqueeze(0), 24000)
     return output_path
 
 def speed_up_wav(input_wav_path, output_wav_path, speed_factor=1.5):
@@ -123,25 +147,12 @@ def speed_up_wav(input_wav_path, output_wav_path, speed_factor=1.5):
     sped_up_audio.export(output_wav_path, format="wav")
 
 def generate_audio_mp3(prompt, language, speaker_wav_path):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    xtts_model.to(device)
+    xtts_model = registry.get("xtts")
 
     prompt = re.sub("([^\x00-\x7F]|\w)(\.|\。|\?)", r"\1 \2\2", prompt)
     print("prompt: ",prompt)
-    # Check if speaker latents are already calculated
-    if speaker_wav_path in speaker_latents_cache:
-        gpt_cond_latent, speaker_embedding = speaker_latents_cache[speaker_wav_path]
-    else:
-        start_time_latents = time.time()
-        gpt_cond_latent, speaker_embedding = xtts_model.get_conditioning_latents(
-            audio_path=speaker_wav_path,
-            gpt_cond_len=30,
-            gpt_cond_chunk_len=4,
-            max_ref_length=60,
-        )
-        latents_time = time.time() - start_time_latents
-        # Cache the latents for future use
-        speaker_latents_cache[speaker_wav_path] = (gpt_cond_latent, speaker_embedding)
+    # Reuse speaker latents from memory or disk, computing them only on a miss
+    gpt_cond_latent, speaker_embedding = latent_store.get(xtts_model, speaker_wav_path)
 
     start_time_inference = time.time()
 
@@ -210,8 +221,6 @@ def check_language_existence(lang):
     else:
         return False
 
-from Wav2Lip import Processor
-
 def process_wav2lip(face_path, audio_path, output_path):
     """
     Processes a video or image and audio using Wav2Lip to produce a video with the audio's lip movements.
@@ -221,9 +230,46 @@ def process_wav2lip(face_path, audio_path, output_path):
     audio_path (str): Path to the audio file (wav format).
     output_path (str): Path where the output video should be saved.
     """
-    processor = Processor()
+    processor = registry.get("wav2lip")
     processor.run(face_path, audio_path, output_path)
 
+def reply_audio_chunks(text, language, speaker_wav_path=SPEAKER_WAV_PATH):
+    """Yields the reply waveform in chunks while XTTS is still decoding it."""
+    xtts_model = registry.get("xtts")
+    gpt_cond_latent, speaker_embedding = latent_store.get(xtts_model, speaker_wav_path)
+    return speech.synthesize_stream(
+        xtts_model, text, language, gpt_cond_latent, speaker_embedding
+    )
+
+def stream_wav2lip(face_path, text, language, speaker_wav_path=SPEAKER_WAV_PATH):
+    """
+    Yields the lip-synced reply as an MPEG-TS stream while XTTS is still
+    decoding it, so video starts after one audio chunk rather than the whole clip.
+    """
+    audio_chunks = reply_audio_chunks(text, language, speaker_wav_path)
+    processor = registry.get("wav2lip")
+    yield from processor.run_stream(
+        face_path, audio_chunks, sample_rate=speech.XTTS_SAMPLE_RATE
+    )
+
+def lipsync_response(face_path, text, language, speaker_wav_path, stream, output_path):
+    """Speaks text with XTTS and lip-syncs it onto the avatar, as an mp4 or a TS stream."""
+    if stream:
+        return Response(
+            stream_with_context(
+                stream_wav2lip(face_path, text, language, speaker_wav_path)
+            ),
+            mimetype="video/mp2t",
+        )
+
+    audio_path = test_xtts(text, language, speaker_wav_path)
+
+    if not os.path.exists("mp4"):
+        os.mkdir("mp4")
+
+    process_wav2lip(face_path, audio_path, output_path)
+    return send_file(output_path, mimetype='video/mp4')
+
 def base64_to_mp3(base64_string, output_filename):
     # Decode the base64 string
     mp3_data = base64.b64decode(base64_string)
@@ -236,9 +282,89 @@ def base64_to_mp3(base64_string, output_filename):
 def index():
     return send_from_directory(app.static_folder, 'index.html')
 
+@app.route("/healthz")
+def healthz():
+    # Liveness only: the process is up and serving, models may still be loading
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz")
+def readyz():
+    status = registry.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route("/models/memory")
+def models_memory():
+    return jsonify(registry.memory_report())
+
+# Speech only, streamed as binary audio while it is being synthesized
+@app.route("/speech_stream", methods=["POST"])
+def speech_stream():
+    if not registry.ready():
+        return jsonify({"error": "Models are still loading"}), 503
+    data = request.get_json(silent=True) or request.form
+    text = data.get("text", "")
+    language = data.get("language", "en")
+    stream_format = data.get("format", "ogg")
+    if not text.strip():
+        return jsonify({"error": "No text"}), 400
+    if not check_language_existence(language):
+        return jsonify({"error": f"Unsupported language: {language}"}), 400
+    if stream_format not in audio_stream.STREAM_FORMATS:
+        return jsonify({"error": f"Unsupported format: {stream_format}"}), 400
+    if language == "zh":
+        language = "zh-cn"
+
+    chunks = reply_audio_chunks(text, language)
+    return Response(
+        stream_with_context(
+            audio_stream.encode_stream(chunks, speech.XTTS_SAMPLE_RATE, stream_format)
+        ),
+        mimetype=audio_stream.mimetype(stream_format),
+    )
+
+# Text - Speech - Lip-sync, for clients that already have the reply text
+@app.route("/speak", methods=["POST"])
+def speak():
+    if not registry.ready():
+        return jsonify({"error": "Models are still loading"}), 503
+    start_time = time.time()
+    data = request.get_json(silent=True) or request.form
+    text = data.get("text", "")
+    language = data.get("language", "en")
+    avatar_id = data.get("avatar_id", "trump")
+    voice_id = data.get("voice_id", "trump")
+    if not text.strip():
+        return jsonify({"error": "No text"}), 400
+    if not check_language_existence(language):
+        return jsonify({"error": f"Unsupported language: {language}"}), 400
+    if avatar_id not in AVATARS:
+        return jsonify({"error": f"Unknown avatar: {avatar_id}"}), 400
+    if voice_id not in VOICES:
+        return jsonify({"error": f"Unknown voice: {voice_id}"}), 400
+    if language == "zh":
+        language = "zh-cn"
+
+    try:
+        response = lipsync_response(
+            AVATARS[avatar_id],
+            text,
+            language,
+            VOICES[voice_id],
+            stream=request.args.get("stream") == "1",
+            output_path=f"mp4/output_{uuid.uuid4()}.mp4",
+        )
+        print("Total time:", time.time() - start_time)
+        return response
+
+    except Exception as e:
+        print(e)
+        return jsonify({"error": str(e)}), 500
+
 # Transcribe - Translate - Speech with additional info:
 @app.route("/transcribe_speech_wav2lips", methods=["POST"])
 def transcribe_speech_wav2lips():
+    if not registry.ready():
+        return jsonify({"error": "Models are still loading"}), 503
     start_time = time.time()
     if "file" not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -252,7 +378,7 @@ def transcribe_speech_wav2lips():
     file.save(input_filename)
 
     try:
-        segments, info = whisper_model.transcribe(
+        segments, info = registry.get("whisper").transcribe(
             audio=input_filename,
             beam_size=1,
             temperature=0,
@@ -273,17 +399,19 @@ def transcribe_speech_wav2lips():
 
         joined_text = " ".join([segment["text"] for segment in segment_list])
      
-        # Generate audio using XTTS
-        audio_path = test_xtts(joined_text, "en")
-
-        if not os.path.exists("mp4"):
-            os.mkdir("mp4")
-
-        process_wav2lip("trump.jpg", audio_path, f"mp4/output_{fileid}.mp4")
+        # Generate audio using XTTS and lip-sync it, streamed with ?stream=1
+        response = lipsync_response(
+            "trump.jpg",
+            joined_text,
+            "en",
+            SPEAKER_WAV_PATH,
+            stream=request.args.get("stream") == "1",
+            output_path=f"mp4/output_{fileid}.mp4",
+        )
         
         end_time = time.time()
         print("Total time:", end_time - start_time)
-        return send_file(f"mp4/output_{fileid}.mp4", mimetype='video/mp4')
+        return response
 
     except Exception as e:
         os.remove(input_filename)
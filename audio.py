@@ -1,6 +1,7 @@
 import librosa
 import librosa.filters
 import numpy as np
+import warnings
 
 # import tensorflow as tf
 from scipy import signal
@@ -12,6 +13,12 @@ def load_wav(path, sr):
     return librosa.core.load(path, sr=sr)[0]
 
 
+def resample(wav, orig_sr, target_sr):
+    if orig_sr == target_sr:
+        return wav
+    return librosa.resample(wav, orig_sr=orig_sr, target_sr=target_sr)
+
+
 def save_wav(wav, path, sr):
     wav *= 32767 / max(0.01, np.max(np.abs(wav)))
     # proposed by @dsmiller
@@ -53,6 +60,10 @@ def linearspectrogram(wav):
 
 def melspectrogram(wav):
     D = _stft(preemphasis(wav, hp.preemphasis, hp.preemphasize))
+    return _stft_to_mel(D)
+
+
+def _stft_to_mel(D):
     S = _amp_to_db(_linear_to_mel(np.abs(D))) - hp.ref_level_db
 
     if hp.signal_normalization:
@@ -60,6 +71,78 @@ def melspectrogram(wav):
     return S
 
 
+class MelStream:
+    """
+    Computes melspectrogram() of audio that arrives in chunks, returning only
+    the frames each new chunk completes.
+
+    Resampling and pre-emphasis carry their state across chunks, and a frame
+    is only returned once its STFT window is fully covered by audio, so the
+    concatenated output matches melspectrogram() of the whole waveform. Only
+    the samples the next window still needs are kept, so each chunk costs
+    time proportional to its own length.
+    """
+
+    def __init__(self, sample_rate):
+        self._resampler = None
+        if sample_rate != hp.sample_rate:
+            import soxr
+
+            # Same resampler librosa.resample uses by default
+            self._resampler = soxr.ResampleStream(
+                sample_rate, hp.sample_rate, 1, dtype="float32", quality="HQ"
+            )
+        self._hop = get_hop_size()
+        # librosa centres frame t on sample t * hop, padding n_fft // 2 on each side
+        self._half = hp.n_fft // 2
+        assert self._half % self._hop == 0, "n_fft must be a multiple of 2 * hop_size"
+        self._wav = np.zeros(0)  # pre-emphasized samples from _start on
+        self._start = 0
+        self._last_sample = 0.0
+        self.num_frames = 0
+
+    def push(self, chunk, last=False):
+        """
+        Adds a chunk of samples and returns the (num_mels, T) frames it
+        completes. last=True flushes the end, padded like melspectrogram().
+        """
+        wav = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        if self._resampler is not None:
+            wav = self._resampler.resample_chunk(wav, last=last)
+        wav = wav.astype(np.float64)
+        if hp.preemphasize and len(wav):
+            previous = np.concatenate(([self._last_sample], wav[:-1]))
+            self._last_sample = wav[-1]
+            wav = wav - hp.preemphasis * previous
+        self._wav = np.concatenate((self._wav, wav))
+
+        total = self._start + len(self._wav)
+        if last:
+            end_frame = total // self._hop + 1
+        else:
+            # Frames whose window ends inside the audio received so far
+            end_frame = max(0, (total - self._half) // self._hop + 1)
+        if end_frame <= self.num_frames:
+            return np.zeros((hp.num_mels, 0))
+
+        # Take enough context that the centred STFT's padding only reaches
+        # past the first frames, which are dropped again
+        first = max(0, self.num_frames * self._hop - self._half)
+        stop = total if last else (end_frame - 1) * self._hop + self._half
+        with warnings.catch_warnings():
+            # The flushed tail can be shorter than n_fft; its padding is intended
+            warnings.simplefilter("ignore", UserWarning)
+            D = _stft(self._wav[first - self._start : stop - self._start])
+        skip = (self.num_frames * self._hop - first) // self._hop
+        mel = _stft_to_mel(D[:, skip : skip + end_frame - self.num_frames])
+
+        self.num_frames = end_frame
+        keep_from = max(0, self.num_frames * self._hop - self._half)
+        self._wav = self._wav[keep_from - self._start :]
+        self._start = keep_from
+        return mel
+
+
 def _lws_processor():
     import lws
 
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+# ffmpeg output arguments and HTTP mimetype per supported stream format
+STREAM_FORMATS = {
+    "ogg": (["-c:a", "libopus", "-application", "voip", "-f", "ogg"], "audio/ogg"),
+    "mp3": (["-c:a", "libmp3lame", "-f", "mp3"], "audio/mpeg"),
+}
+
+
+def mimetype(stream_format):
+    return STREAM_FORMATS[stream_format][1]
+
+
+def encode_stream(
+    chunks,
+    sample_rate=24000,
+    stream_format="ogg",
+    bitrate="32k",
+    read_size=4096,
+    join_timeout=10,
+):
+    """
+    Encodes float waveform chunks into a compressed audio stream, yielding bytes
+    as soon as ffmpeg emits them.
+
+    Chunks are pulled and written to ffmpeg from a background thread, so
+    synthesis, encoding and sending the response all overlap. If the consumer
+    stops early, the thread stops pulling chunks and closes the chunk
+    generator, so an abandoned request doesn't keep synthesizing.
+    """
+    codec_args, _ = STREAM_FORMATS[stream_format]
+    command = [
+        "ffmpeg", "-loglevel", "error",
+        # Raw PCM needs no probing; without this ffmpeg waits for ~1 s of input
+        "-fflags", "+nobuffer", "-probesize", "32", "-analyzeduration", "0",
+        "-f", "f32le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+        *codec_args, "-b:a", bitrate,
+        # Write each packet out immediately instead of buffering the muxer
+        "-flush_packets", "1",
+        "pipe:1",
+    ]
+    process = subprocess.Popen(
+        command, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+    stop = threading.Event()
+    errors = []
+
+    def _feed():
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                if stop.is_set():
+                    break
+                process.stdin.write(np.asarray(chunk, dtype=np.float32).tobytes())
+                process.stdin.flush()
+        except Exception as e:
+            if not stop.is_set():
+                errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            # Runs the generator's cleanup (e.g. stops XTTS) on this thread,
+            # which is the one iterating it
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    feeder = threading.Thread(target=_feed, name="audio-encoder", daemon=True)
+    feeder.start()
+
+    completed = False
+    try:
+        while True:
+            data = os.read(process.stdout.fileno(), read_size)
+            if not data:
+                break
+            yield data
+        completed = True
+    finally:
+        process.stdout.close()
+        if not completed:
+            # The client went away; stop encoding rather than draining the stream
+            stop.set()
+            process.kill()
+        process.wait()
+        # The feeder notices the stop after the chunk it is waiting on; don't
+        # hold the request thread for longer than join_timeout
+        feeder.join(join_timeout)
+
+    if errors:
+        raise errors[0]
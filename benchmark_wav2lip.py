@@ -0,0 +1,58 @@
+"""
+Benchmarks Wav2Lip generator throughput on the CPU for each eager engine
+option: default NCHW fp32, channels_last, bf16 autocast and both together.
+
+    python benchmark_wav2lip.py --batch-size 128 --runs 5
+
+bf16 falls back to fp32 on CPUs without AVX512-BF16/AMX, which the output
+notes. Outputs are also compared with the fp32 baseline.
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from Wav2Lip import Processor
+
+CONFIGS = [
+    ("fp32", {}),
+    ("channels_last", {"channels_last": True}),
+    ("bf16", {"bf16": True}),
+    ("channels_last+bf16", {"channels_last": True, "bf16": True}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wav2Lip CPU engine option benchmark")
+    parser.add_argument("--checkpoint", default=None, help="Wav2Lip checkpoint (.pth)")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    mel_batch = rng.standard_normal((args.batch_size, 80, 16, 1), dtype=np.float32)
+    img_batch = rng.random((args.batch_size, 96, 96, 6))
+
+    baseline = None
+    for name, options in CONFIGS:
+        options = {"device": "cpu", **options}
+        if args.checkpoint is not None:
+            options["checkpoint_path"] = args.checkpoint
+        processor = Processor(**options)
+        processor.warmup(args.batch_size)
+
+        start_time = time.time()
+        for _ in range(args.runs):
+            pred = processor.infer(mel_batch, img_batch)
+        fps = args.batch_size * args.runs / (time.time() - start_time)
+
+        if baseline is None:
+            baseline = pred
+        diff = np.abs(pred - baseline).max() * 255.0
+        fallback = " (bf16 unsupported, ran fp32)" if options.get("bf16") and not processor.bf16 else ""
+        print(f"{name}: {fps:.1f} frames/s, max diff vs fp32 {diff:.2f}/255{fallback}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compares fp32 and dynamically quantized int8 XTTS on the CPU.
+
+For each sentence both models synthesize with the same seed; the script
+reports the real-time factor (synthesis time / audio duration, lower is
+better) and the cosine similarity between the speaker embedding of the
+output and that of the reference voice, measured with the fp32 model's
+speaker encoder.
+
+    python benchmark_xtts_int8.py --speaker-wav trump.wav --runs 3
+
+The int8 artifact is written to XTTS_INT8_PATH (next to the checkpoint by
+default) if it does not exist yet, so the server can load it directly.
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+from scipy.io import wavfile
+
+from model_registry import load_xtts
+from speech import XTTS_SAMPLE_RATE
+
+SENTENCES = [
+    "Hello there! Great to see you!",
+    "We are going to build something tremendous, believe me.",
+    "The weather today is fantastic, maybe the best weather ever.",
+]
+
+
+def speaker_similarity(reference_model, wav, reference_embedding):
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        path = f.name
+    try:
+        wavfile.write(path, XTTS_SAMPLE_RATE, np.asarray(wav, dtype=np.float32))
+        _, embedding = reference_model.get_conditioning_latents(audio_path=[path])
+    finally:
+        os.remove(path)
+    return torch.nn.functional.cosine_similarity(
+        embedding.flatten(), reference_embedding.flatten(), dim=0
+    ).item()
+
+
+def benchmark(name, xtts_model, reference_model, speaker_wav, reference_embedding, runs):
+    gpt_cond_latent, speaker_embedding = xtts_model.get_conditioning_latents(
+        audio_path=[speaker_wav]
+    )
+    rtfs, similarities = [], []
+    for text in SENTENCES:
+        for run in range(runs):
+            torch.manual_seed(run)
+            start_time = time.time()
+            out = xtts_model.inference(text, "en", gpt_cond_latent, speaker_embedding)
+            elapsed = time.time() - start_time
+            rtfs.append(elapsed / (len(out["wav"]) / XTTS_SAMPLE_RATE))
+            similarities.append(
+                speaker_similarity(reference_model, out["wav"], reference_embedding)
+            )
+    print(
+        f"{name}: RTF {np.mean(rtfs):.3f} (+/- {np.std(rtfs):.3f}), "
+        f"speaker similarity {np.mean(similarities):.3f} (+/- {np.std(similarities):.3f})"
+    )
+    return np.mean(rtfs), np.mean(similarities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A/B fp32 vs int8 XTTS on CPU")
+    parser.add_argument("--model-dir", default=None, help="XTTS checkpoint directory")
+    parser.add_argument("--speaker-wav", default="trump.wav", help="Reference voice")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per sentence")
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads, 0 for default")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    fp32_model = load_xtts(args.model_dir, use_deepspeed=False, int8=False).to("cpu")
+    int8_model = load_xtts(args.model_dir, use_deepspeed=False, int8=True)
+
+    _, reference_embedding = fp32_model.get_conditioning_latents(audio_path=[args.speaker_wav])
+
+    fp32_rtf, fp32_sim = benchmark(
+        "fp32", fp32_model, fp32_model, args.speaker_wav, reference_embedding, args.runs
+    )
+    int8_rtf, int8_sim = benchmark(
+        "int8", int8_model, fp32_model, args.speaker_wav, reference_embedding, args.runs
+    )
+    print(f"int8 speedup: {fp32_rtf / int8_rtf:.2f}x, similarity change: {int8_sim - fp32_sim:+.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compares the int8 Wav2Lip generator from wav2lip_quant.py against fp32.
+
+For every face/audio pair both generators render the same mouth crops.
+The script reports:
+  - lip-sync confidence: mean cosine similarity between SyncNet_color audio
+    and face embeddings over 5-frame windows (higher is better),
+  - pixel error of int8 against fp32: mean absolute error on the 0-255
+    scale and PSNR,
+  - generator time per batch.
+
+    python eval_wav2lip_int8.py --faces trump.jpg --audios trump.wav
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from models import SyncNet_color
+from wav2lip_quant import face_mel_batches
+
+# SyncNet sees 5 consecutive frames stacked on channels
+SYNCNET_T = 5
+
+
+def load_syncnet(path):
+    model = SyncNet_color()
+    checkpoint = torch.load(path, map_location="cpu")
+    s = checkpoint["state_dict"]
+    model.load_state_dict({k.replace("module.", ""): v for k, v in s.items()})
+    return model.eval()
+
+
+@torch.no_grad()
+def sync_confidence(syncnet, preds, mels):
+    """Mean audio/face embedding cosine similarity over all SYNCNET_T-frame windows."""
+    # Lower half of each generated face, as SyncNet was trained on
+    lower = preds[:, :, preds.shape[2] // 2 :]
+    scores = []
+    for start in range(0, len(preds) - SYNCNET_T + 1, 64):
+        idx = range(start, min(start + 64, len(preds) - SYNCNET_T + 1))
+        faces = torch.stack(
+            [torch.cat(list(lower[i : i + SYNCNET_T]), dim=0) for i in idx]
+        )
+        audio_embedding, face_embedding = syncnet(mels[list(idx)], faces)
+        scores.append(F.cosine_similarity(audio_embedding, face_embedding))
+    return torch.cat(scores).mean().item()
+
+
+@torch.no_grad()
+def generate(model, batches):
+    preds, seconds = [], 0.0
+    for mel_batch, img_batch in batches:
+        start_time = time.time()
+        preds.append(model(mel_batch, img_batch))
+        seconds += time.time() - start_time
+    return torch.cat(preds), seconds / len(batches)
+
+
+def main():
+    from Wav2Lip import Processor
+
+    parser = argparse.ArgumentParser(description="fp32 vs int8 Wav2Lip quality check")
+    parser.add_argument("--checkpoint", default=None, help="Wav2Lip checkpoint (.pth)")
+    parser.add_argument(
+        "--syncnet",
+        default=os.path.join(os.getenv("MODEL_DIR", ""), "wav2lip", "lipsync_expert.pth"),
+        help="SyncNet_color checkpoint",
+    )
+    parser.add_argument("--faces", nargs="+", default=["trump.jpg", "biden2.jpeg"])
+    parser.add_argument("--audios", nargs="+", default=["trump.wav"])
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    options = {"device": "cpu"}
+    if args.checkpoint is not None:
+        options["checkpoint_path"] = args.checkpoint
+    processor = Processor(**options)
+    fp32_model = processor.load_model(processor.checkpoint_path)
+    int8_model = Processor(backend="int8", **options).load_model(processor.checkpoint_path)
+    syncnet = load_syncnet(args.syncnet)
+
+    for face in args.faces:
+        for audio_file in args.audios:
+            batches = list(face_mel_batches(processor, face, audio_file, args.batch_size))
+            mels = torch.cat([mel_batch for mel_batch, _ in batches])
+
+            fp32_preds, fp32_seconds = generate(fp32_model, batches)
+            int8_preds, int8_seconds = generate(int8_model, batches)
+
+            mae = (int8_preds - fp32_preds).abs().mean().item() * 255.0
+            mse = ((int8_preds - fp32_preds) ** 2).mean().item()
+            psnr = 10 * np.log10(1.0 / max(mse, 1e-12))
+            fp32_sync = sync_confidence(syncnet, fp32_preds, mels)
+            int8_sync = sync_confidence(syncnet, int8_preds, mels)
+
+            print(f"{face} + {audio_file} ({len(fp32_preds)} frames)")
+            print(f"  sync confidence: fp32 {fp32_sync:.4f}, int8 {int8_sync:.4f} ({int8_sync - fp32_sync:+.4f})")
+            print(f"  int8 vs fp32: MAE {mae:.2f}/255, PSNR {psnr:.1f} dB")
+            print(
+                f"  generator: fp32 {fp32_seconds * 1000:.0f} ms/batch, "
+                f"int8 {int8_seconds * 1000:.0f} ms/batch ({fp32_seconds / int8_seconds:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
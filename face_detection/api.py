@@ -45,7 +45,8 @@ ROOT = os.path.dirname(os.path.abspath(__file__))
 
 class FaceAlignment:
     def __init__(self, landmarks_type, network_size=NetworkSize.LARGE,
-                 device='cuda', flip_input=False, face_detector='sfd', verbose=False):
+                 device='cuda', flip_input=False, face_detector='sfd', verbose=False,
+                 face_detector_kwargs=None):
         self.device = device
         self.flip_input = flip_input
         self.landmarks_type = landmarks_type
@@ -59,7 +60,8 @@ class FaceAlignment:
         # Get the face detector
         face_detector_module = __import__('face_detection.detection.' + face_detector,
                                           globals(), locals(), [face_detector], 0)
-        self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose)
+        self.face_detector = face_detector_module.FaceDetector(
+            device=device, verbose=verbose, **(face_detector_kwargs or {}))
 
     def get_detections_for_batch(self, images):
         images = images[..., ::-1]
@@ -31,10 +31,14 @@ def detect(net, img, device):
 
     bboxlist = []
     for i in range(len(olist) // 2):
-        olist[i * 2] = F.softmax(olist[i * 2], dim=1)
-    olist = [oelem.data.cpu() for oelem in olist]
+        if olist[i * 2] is not None:
+            olist[i * 2] = F.softmax(olist[i * 2], dim=1)
+    olist = [None if oelem is None else oelem.data.cpu() for oelem in olist]
     for i in range(len(olist) // 2):
         ocls, oreg = olist[i * 2], olist[i * 2 + 1]
+        if ocls is None:
+            # head pruned by face size
+            continue
         FB, FC, FH, FW = ocls.size()  # feature map size
         stride = 2**(i + 2)    # 4,8,16,32,64,128
         anchor = stride * 4
@@ -69,10 +73,14 @@ def batch_detect(net, imgs, device):
 
     bboxlist = []
     for i in range(len(olist) // 2):
-        olist[i * 2] = F.softmax(olist[i * 2], dim=1)
-    olist = [oelem.data.cpu() for oelem in olist]
+        if olist[i * 2] is not None:
+            olist[i * 2] = F.softmax(olist[i * 2], dim=1)
+    olist = [None if oelem is None else oelem.data.cpu() for oelem in olist]
     for i in range(len(olist) // 2):
         ocls, oreg = olist[i * 2], olist[i * 2 + 1]
+        if ocls is None:
+            # head pruned by face size
+            continue
         FB, FC, FH, FW = ocls.size()  # feature map size
         stride = 2**(i + 2)    # 4,8,16,32,64,128
         anchor = stride * 4
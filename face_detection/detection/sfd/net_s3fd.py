@@ -20,6 +20,16 @@ class L2Norm(nn.Module):
 
 
 class s3fd(nn.Module):
+    # (feature normalisation, conf conv, loc conv) of each detection head
+    HEADS = [
+        ('conv3_3_norm', 'conv3_3_norm_mbox_conf', 'conv3_3_norm_mbox_loc'),
+        ('conv4_3_norm', 'conv4_3_norm_mbox_conf', 'conv4_3_norm_mbox_loc'),
+        ('conv5_3_norm', 'conv5_3_norm_mbox_conf', 'conv5_3_norm_mbox_loc'),
+        (None, 'fc7_mbox_conf', 'fc7_mbox_loc'),
+        (None, 'conv6_2_mbox_conf', 'conv6_2_mbox_loc'),
+        (None, 'conv7_2_mbox_conf', 'conv7_2_mbox_loc'),
+    ]
+
     def __init__(self):
         super(s3fd, self).__init__()
         self.conv1_1 = nn.Conv2d(3, 64, kernel_size=3, stride=1, padding=1)
@@ -66,8 +76,16 @@ class s3fd(nn.Module):
         self.conv6_2_mbox_loc = nn.Conv2d(512, 4, kernel_size=3, stride=1, padding=1)
         self.conv7_2_mbox_conf = nn.Conv2d(256, 2, kernel_size=3, stride=1, padding=1)
         self.conv7_2_mbox_loc = nn.Conv2d(256, 4, kernel_size=3, stride=1, padding=1)
+        # Indices (0-5, strides 4-128) of the detection heads forward computes;
+        # see SFDDetector for pruning them by face size
+        self.active_heads = list(range(len(self.HEADS)))
 
     def forward(self, x):
+        """Returns [cls1, reg1, ..., cls6, reg6]; pruned heads are None, and the
+        backbone stops after the deepest active head."""
+        deepest = max(self.active_heads)
+        features = []
+
         h = F.relu(self.conv1_1(x))
         h = F.relu(self.conv1_2(h))
         h = F.max_pool2d(h, 2, 2)
@@ -79,51 +97,49 @@ class s3fd(nn.Module):
         h = F.relu(self.conv3_1(h))
         h = F.relu(self.conv3_2(h))
         h = F.relu(self.conv3_3(h))
-        f3_3 = h
-        h = F.max_pool2d(h, 2, 2)
-
-        h = F.relu(self.conv4_1(h))
-        h = F.relu(self.conv4_2(h))
-        h = F.relu(self.conv4_3(h))
-        f4_3 = h
-        h = F.max_pool2d(h, 2, 2)
-
-        h = F.relu(self.conv5_1(h))
-        h = F.relu(self.conv5_2(h))
-        h = F.relu(self.conv5_3(h))
-        f5_3 = h
-        h = F.max_pool2d(h, 2, 2)
-
-        h = F.relu(self.fc6(h))
-        h = F.relu(self.fc7(h))
-        ffc7 = h
-        h = F.relu(self.conv6_1(h))
-        h = F.relu(self.conv6_2(h))
-        f6_2 = h
-        h = F.relu(self.conv7_1(h))
-        h = F.relu(self.conv7_2(h))
-        f7_2 = h
-
-        f3_3 = self.conv3_3_norm(f3_3)
-        f4_3 = self.conv4_3_norm(f4_3)
-        f5_3 = self.conv5_3_norm(f5_3)
-
-        cls1 = self.conv3_3_norm_mbox_conf(f3_3)
-        reg1 = self.conv3_3_norm_mbox_loc(f3_3)
-        cls2 = self.conv4_3_norm_mbox_conf(f4_3)
-        reg2 = self.conv4_3_norm_mbox_loc(f4_3)
-        cls3 = self.conv5_3_norm_mbox_conf(f5_3)
-        reg3 = self.conv5_3_norm_mbox_loc(f5_3)
-        cls4 = self.fc7_mbox_conf(ffc7)
-        reg4 = self.fc7_mbox_loc(ffc7)
-        cls5 = self.conv6_2_mbox_conf(f6_2)
-        reg5 = self.conv6_2_mbox_loc(f6_2)
-        cls6 = self.conv7_2_mbox_conf(f7_2)
-        reg6 = self.conv7_2_mbox_loc(f7_2)
-
-        # max-out background label
-        chunk = torch.chunk(cls1, 4, 1)
-        bmax = torch.max(torch.max(chunk[0], chunk[1]), chunk[2])
-        cls1 = torch.cat([bmax, chunk[3]], dim=1)
-
-        return [cls1, reg1, cls2, reg2, cls3, reg3, cls4, reg4, cls5, reg5, cls6, reg6]
+        features.append(h)
+
+        if deepest >= 1:
+            h = F.max_pool2d(h, 2, 2)
+            h = F.relu(self.conv4_1(h))
+            h = F.relu(self.conv4_2(h))
+            h = F.relu(self.conv4_3(h))
+            features.append(h)
+
+        if deepest >= 2:
+            h = F.max_pool2d(h, 2, 2)
+            h = F.relu(self.conv5_1(h))
+            h = F.relu(self.conv5_2(h))
+            h = F.relu(self.conv5_3(h))
+            features.append(h)
+
+        if deepest >= 3:
+            h = F.max_pool2d(h, 2, 2)
+            h = F.relu(self.fc6(h))
+            h = F.relu(self.fc7(h))
+            features.append(h)
+
+        if deepest >= 4:
+            h = F.relu(self.conv6_1(h))
+            h = F.relu(self.conv6_2(h))
+            features.append(h)
+
+        if deepest >= 5:
+            h = F.relu(self.conv7_1(h))
+            h = F.relu(self.conv7_2(h))
+            features.append(h)
+
+        outputs = [None] * (2 * len(self.HEADS))
+        for i in self.active_heads:
+            norm, conf, loc = self.HEADS[i]
+            f = features[i] if norm is None else getattr(self, norm)(features[i])
+            outputs[2 * i] = getattr(self, conf)(f)
+            outputs[2 * i + 1] = getattr(self, loc)(f)
+
+        if outputs[0] is not None:
+            # max-out background label
+            chunk = torch.chunk(outputs[0], 4, 1)
+            bmax = torch.max(torch.max(chunk[0], chunk[1]), chunk[2])
+            outputs[0] = torch.cat([bmax, chunk[3]], dim=1)
+
+        return outputs
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import torch
+
+
+def exported_path(path_to_detector, backend):
+    """Where sfd_export.py writes the ``onnx``/``int8`` variant of a checkpoint."""
+    extension = {'onnx': '.onnx', 'int8': '_int8.onnx'}[backend]
+    return os.path.splitext(path_to_detector)[0] + extension
+
+
+def output_names(active_heads):
+    names = []
+    for i in active_heads:
+        names += ['cls%d' % (i + 1), 'reg%d' % (i + 1)]
+    return names
+
+
+def write_metadata(path, active_heads, min_face_size=None, max_face_size=None):
+    """Records the face size range and heads an export was made for in the
+    model's ONNX metadata, which OnnxS3FD reads back."""
+    import onnx
+
+    model = onnx.load(path)
+    metadata = {prop.key: prop.value for prop in model.metadata_props}
+    metadata.update({
+        'active_heads': ','.join(str(i) for i in active_heads),
+        'min_face_size': str(min_face_size or ''),
+        'max_face_size': str(max_face_size or ''),
+    })
+    onnx.helper.set_model_props(model, metadata)
+    onnx.save(model, path)
+
+
+class OnnxS3FD(object):
+    """Runs an exported s3fd with ONNX Runtime behind the eager model's call
+    signature, returning None for heads pruned at export time."""
+
+    def __init__(self, path, device='cpu'):
+        import onnxruntime
+        from onnxruntime.capi.onnxruntime_pybind11_state import Fail, RuntimeException
+
+        providers = ['CPUExecutionProvider']
+        if 'cuda' in device:
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = onnxruntime.InferenceSession(path, providers=providers)
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.active_heads = [int(name[3:]) - 1 for name in self.output_names if name.startswith('cls')]
+        # Face size range of the export, None when unbounded or not recorded
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.min_face_size = int(metadata['min_face_size']) if metadata.get('min_face_size') else None
+        self.max_face_size = int(metadata['max_face_size']) if metadata.get('max_face_size') else None
+        self.errors = (Fail, RuntimeException)
+
+    def __call__(self, x):
+        try:
+            outputs = self.session.run(self.output_names, {'image': np.ascontiguousarray(x.cpu().numpy())})
+        except self.errors as e:
+            # ONNX Runtime's errors aren't RuntimeErrors; raise one like torch
+            # does on allocation failure, so callers' OOM retries still apply
+            raise RuntimeError(str(e)) from e
+        olist = [None] * 12
+        for name, output in zip(self.output_names, outputs):
+            i = int(name[3:]) - 1
+            olist[2 * i + (name.startswith('reg'))] = torch.from_numpy(output)
+        return olist
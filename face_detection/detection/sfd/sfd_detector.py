@@ -1,5 +1,6 @@
 import os
 import cv2
+import numpy as np
 from torch.utils.model_zoo import load_url
 
 from ..core import FaceDetector
@@ -12,26 +13,93 @@ models_urls = {
     's3fd': 'https://www.adrianbulat.com/downloads/python-fan/s3fd-619a316812.pth',
 }
 
+# Face size (px, in the network input) that min_face_size is scaled down to;
+# comfortably inside what the stride 8-16 heads detect
+SCALED_MIN_FACE_SIZE = 64
+
 
 class SFDDetector(FaceDetector):
-    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False):
+    """S3FD face detector.
+
+    ``min_face_size``/``max_face_size`` (px, longer box side in the input
+    frame) bound the faces worth finding. Frames are downscaled so the
+    smallest face is SCALED_MIN_FACE_SIZE px, and detection heads whose
+    anchors can't match a face in the scaled range are skipped, along with
+    the backbone layers only they need. Both default to None (no bound).
+
+    ``backend`` is "torch" for the eager model, or "onnx"/"int8" for the
+    ONNX Runtime models sfd_export.py writes next to the checkpoint; those
+    keep the heads chosen when they were exported, so the face size bounds
+    must select the same heads or a ValueError is raised.
+    """
+
+    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False,
+                 min_face_size=None, max_face_size=None, backend='torch'):
         super(SFDDetector, self).__init__(device, verbose)
+        self.min_face_size = min_face_size
+        self.max_face_size = max_face_size
+
+        self.input_scale = 1.0
+        if min_face_size:
+            self.input_scale = min(1.0, SCALED_MIN_FACE_SIZE / min_face_size)
+        active_heads = self.heads_for_face_sizes(
+            min_face_size and min_face_size * self.input_scale,
+            max_face_size and max_face_size * self.input_scale)
 
         # Initialise the face detector
-        if not os.path.isfile(path_to_detector):
-            model_weights = load_url(models_urls['s3fd'])
+        if backend != 'torch':
+            from .onnx_s3fd import OnnxS3FD, exported_path
+
+            path = exported_path(path_to_detector, backend)
+            if not os.path.isfile(path):
+                raise FileNotFoundError('%s not found, export it with sfd_export.py' % path)
+            self.face_detector = OnnxS3FD(path, device)
+            if self.face_detector.active_heads != active_heads:
+                raise ValueError(
+                    '%s was exported with heads %s (min_face_size=%s, max_face_size=%s) but '
+                    'min_face_size=%s, max_face_size=%s need heads %s; pass the export bounds '
+                    'or re-export with sfd_export.py' % (
+                        path, self.face_detector.active_heads, self.face_detector.min_face_size,
+                        self.face_detector.max_face_size, min_face_size, max_face_size, active_heads))
         else:
-            model_weights = torch.load(path_to_detector)
+            if not os.path.isfile(path_to_detector):
+                model_weights = load_url(models_urls['s3fd'])
+            else:
+                model_weights = torch.load(path_to_detector, map_location=device)
+
+            self.face_detector = s3fd()
+            self.face_detector.load_state_dict(model_weights)
+            self.face_detector.to(device)
+            self.face_detector.eval()
+            self.face_detector.active_heads = active_heads
 
-        self.face_detector = s3fd()
-        self.face_detector.load_state_dict(model_weights)
-        self.face_detector.to(device)
-        self.face_detector.eval()
+    @staticmethod
+    def heads_for_face_sizes(min_face_size=None, max_face_size=None):
+        """Indices of the heads whose anchors (16-512 px) lie within a factor of
+        two of the face size range; the smallest and largest heads also cover
+        faces beyond their side."""
+        heads = []
+        for i in range(len(s3fd.HEADS)):
+            anchor = 2**(i + 2) * 4
+            if max_face_size and i > 0 and anchor / 2 > max_face_size:
+                continue
+            if min_face_size and i < len(s3fd.HEADS) - 1 and anchor * 2 < min_face_size:
+                continue
+            heads.append(i)
+        return heads
+
+    def _resize(self, image):
+        height, width = image.shape[:2]
+        size = (max(1, round(width * self.input_scale)), max(1, round(height * self.input_scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
 
     def detect_from_image(self, tensor_or_path):
         image = self.tensor_or_path_to_ndarray(tensor_or_path)
+        if self.input_scale < 1:
+            image = self._resize(image)
 
         bboxlist = detect(self.face_detector, image, device=self.device)
+        bboxlist[:, :4] /= self.input_scale
         keep = nms(bboxlist, 0.3)
         bboxlist = bboxlist[keep, :]
         bboxlist = [x for x in bboxlist if x[-1] > 0.5]
@@ -39,7 +107,11 @@ class SFDDetector(FaceDetector):
         return bboxlist
 
     def detect_from_batch(self, images):
+        if self.input_scale < 1:
+            images = np.stack([self._resize(image) for image in images])
+
         bboxlists = batch_detect(self.face_detector, images, device=self.device)
+        bboxlists[..., :4] /= self.input_scale
         keeps = [nms(bboxlists[:, i, :], 0.3) for i in range(bboxlists.shape[1])]
         bboxlists = [bboxlists[keep, i, :] for i, keep in enumerate(keeps)]
         bboxlists = [[x for x in bboxlist if x[-1] > 0.5] for bboxlist in bboxlists]
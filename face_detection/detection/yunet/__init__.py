@@ -0,0 +1 @@
+from .yunet_detector import YuNetDetector as FaceDetector
\ No newline at end of file
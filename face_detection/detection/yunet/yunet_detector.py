@@ -0,0 +1,91 @@
+import os
+import threading
+import urllib.request
+
+import cv2
+import numpy as np
+
+from ..core import FaceDetector
+
+models_urls = {
+    'yunet': 'https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx',
+}
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV DNN (YuNet) face detector.
+
+    A ~75k parameter network run by ``cv2.FaceDetectorYN``; on CPU it is an
+    order of magnitude faster than SFD at the cost of some recall on small,
+    profile or occluded faces. Boxes come back in the SFD format,
+    ``[x1, y1, x2, y2, score]`` sorted by score.
+
+    Frames are downscaled so their longer side is at most ``detection_size``
+    pixels before detection (0 disables this) and the boxes scaled back.
+    """
+
+    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_detection_yunet_2023mar.onnx'),
+                 verbose=False, detection_size=640, score_threshold=0.5, nms_threshold=0.3):
+        super(YuNetDetector, self).__init__(device, verbose)
+
+        if not os.path.isfile(path_to_detector):
+            urllib.request.urlretrieve(models_urls['yunet'], path_to_detector)
+
+        backend, target = cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_CPU
+        if 'cuda' in device and cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            backend, target = cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA
+
+        self.detection_size = detection_size
+        self.face_detector = cv2.FaceDetectorYN.create(
+            path_to_detector, '', (320, 320), score_threshold, nms_threshold, 5000, backend, target)
+        self.input_size = (320, 320)
+        # The input size is state on the cv2 detector, shared by concurrent requests
+        self.lock = threading.Lock()
+
+    def _detect(self, image):
+        """Detects faces in one RGB image, returning an (N, 5) array of boxes."""
+        height, width = image.shape[:2]
+        scale = 1.0
+        if self.detection_size and max(height, width) > self.detection_size:
+            scale = self.detection_size / max(height, width)
+            image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+        # YuNet was trained on BGR input
+        image = np.ascontiguousarray(image[..., ::-1])
+        input_size = (image.shape[1], image.shape[0])
+        with self.lock:
+            if input_size != self.input_size:
+                self.face_detector.setInputSize(input_size)
+                self.input_size = input_size
+
+            _, faces = self.face_detector.detect(image)
+        if faces is None:
+            return np.zeros((0, 5), dtype=np.float32)
+
+        # x, y, w, h, 5 landmarks, score -> x1, y1, x2, y2, score
+        bboxlist = np.empty((len(faces), 5), dtype=np.float32)
+        bboxlist[:, :2] = faces[:, :2] / scale
+        bboxlist[:, 2:4] = (faces[:, :2] + faces[:, 2:4]) / scale
+        bboxlist[:, 4] = faces[:, -1]
+        return bboxlist[np.argsort(-bboxlist[:, 4])]
+
+    def detect_from_image(self, tensor_or_path):
+        image = self.tensor_or_path_to_ndarray(tensor_or_path)
+
+        return list(self._detect(image))
+
+    def detect_from_batch(self, images):
+        # cv2.dnn has no batched face detector; frames go through one at a time
+        return [list(self._detect(image)) for image in images]
+
+    @property
+    def reference_scale(self):
+        return 195
+
+    @property
+    def reference_x_shift(self):
+        return 0
+
+    @property
+    def reference_y_shift(self):
+        return 0
@@ -23,12 +23,10 @@ def _gaussian(
         sigma_vert = sigma
     center_x = mean_horz * width + 0.5
     center_y = mean_vert * height + 0.5
-    gauss = np.empty((height, width), dtype=np.float32)
-    # generate kernel
-    for i in range(height):
-        for j in range(width):
-            gauss[i][j] = amplitude * math.exp(-(math.pow((j + 1 - center_x) / (
-                sigma_horz * width), 2) / 2.0 + math.pow((i + 1 - center_y) / (sigma_vert * height), 2) / 2.0))
+    # generate kernel, one row and one column of offsets broadcast together
+    x = (np.arange(1, width + 1) - center_x) / (sigma_horz * width)
+    y = (np.arange(1, height + 1) - center_y) / (sigma_vert * height)
+    gauss = (amplitude * np.exp(-(x[None, :] ** 2 / 2.0 + y[:, None] ** 2 / 2.0))).astype(np.float32)
     if normalize:
         gauss = gauss / np.sum(gauss)
     return gauss
@@ -74,19 +72,57 @@ def transform(point, center, scale, resolution, invert=False):
     _pt[0] = point[0]
     _pt[1] = point[1]
 
-    h = 200.0 * scale
-    t = torch.eye(3)
-    t[0, 0] = resolution / h
-    t[1, 1] = resolution / h
-    t[0, 2] = resolution * (-center[0] / h + 0.5)
-    t[1, 2] = resolution * (-center[1] / h + 0.5)
+    t = transform_matrices([center], [scale], resolution, invert)[0]
+    new_point = (torch.matmul(t, _pt))[0:2]
+
+    return new_point.int()
+
+
+def transform_matrices(centers, scales, resolution, invert=False):
+    """Generate the affine transformation matrices of ``transform`` for a batch.
+
+    Arguments:
+        centers {torch.tensor or numpy.array} -- [B, 2] centers of the faces/objects
+        scales {torch.tensor, numpy.array or list} -- [B] scales of the faces/objects
+        resolution {float} -- the output resolution
+
+    Keyword Arguments:
+        invert {bool} -- produce the inverse transformations (default: {False})
+
+    Returns:
+        torch.tensor -- [B, 3, 3] float32 matrices
+    """
+    centers = torch.stack([torch.as_tensor(c, dtype=torch.float64).cpu() for c in centers])
+    scales = torch.tensor([float(sc) for sc in scales], dtype=torch.float64)
+
+    h = 200.0 * scales
+    t = torch.zeros(len(scales), 3, 3, dtype=torch.float64)
+    t[:, 0, 0] = resolution / h
+    t[:, 1, 1] = resolution / h
+    t[:, 0, 2] = resolution * (-centers[:, 0] / h + 0.5)
+    t[:, 1, 2] = resolution * (-centers[:, 1] / h + 0.5)
+    t[:, 2, 2] = 1
+    t = t.float()
 
     if invert:
         t = torch.inverse(t)
+    return t
 
-    new_point = (torch.matmul(t, _pt))[0:2]
 
-    return new_point.int()
+def transform_points(points, matrices):
+    """Apply per-item affine matrices to a batch of 2D points.
+
+    Arguments:
+        points {torch.tensor} -- [B, N, 2] points
+        matrices {torch.tensor} -- [B, 3, 3] matrices from ``transform_matrices``
+
+    Returns:
+        torch.tensor -- [B, N, 2] transformed points, truncated to integers like ``transform``
+    """
+    ones = torch.ones(points.shape[:-1] + (1,), dtype=points.dtype, device=points.device)
+    homogeneous = torch.cat([points, ones], dim=-1)
+    new_points = torch.matmul(homogeneous, matrices.to(points.device).transpose(1, 2))
+    return new_points[..., :2].int()
 
 
 def crop(image, center, scale, resolution=256.0):
@@ -112,7 +148,7 @@ def crop(image, center, scale, resolution=256.0):
                            image.shape[2]], dtype=np.int32)
         newImg = np.zeros(newDim, dtype=np.uint8)
     else:
-        newDim = np.array([br[1] - ul[1], br[0] - ul[0]], dtype=np.int)
+        newDim = np.array([br[1] - ul[1], br[0] - ul[0]], dtype=np.int32)
         newImg = np.zeros(newDim, dtype=np.uint8)
     ht = image.shape[0]
     wd = image.shape[1]
@@ -129,6 +165,35 @@ def crop(image, center, scale, resolution=256.0):
     return newImg
 
 
+def _preds_fromhm(hm):
+    """Heatmap argmax locations with the quarter-pixel shift towards the higher
+    neighbour, for all B x N heatmaps at once.
+
+    Arguments:
+        hm {torch.tensor} -- the predicted heatmaps, of shape [B, N, H, W]
+
+    Returns:
+        torch.tensor -- [B, N, 2] (x, y) points in heatmap coordinates
+    """
+    B, N, H, W = hm.shape
+    flat = hm.reshape(B, N, H * W)
+    _, idx = torch.max(flat, 2)
+    pX, pY = idx % W, idx // W
+
+    def at(y, x):
+        return flat.gather(2, (y * W + x).unsqueeze(-1)).squeeze(-1)
+
+    # Neighbours are clamped in range; border points get no refinement anyway
+    left, right = (pX - 1).clamp(min=0), (pX + 1).clamp(max=W - 1)
+    up, down = (pY - 1).clamp(min=0), (pY + 1).clamp(max=H - 1)
+    diff = torch.stack([at(pY, right) - at(pY, left), at(down, pX) - at(up, pX)], dim=-1)
+    inside = (pX > 0) & (pX < W - 1) & (pY > 0) & (pY < H - 1)
+
+    preds = torch.stack([pX, pY], dim=-1).float() + 1
+    preds += diff.sign().mul_(.25) * inside.unsqueeze(-1)
+    return preds.add_(-.5)
+
+
 def get_preds_fromhm(hm, center=None, scale=None):
     """Obtain (x,y) coordinates given a set of N heatmaps. If the center
     and the scale is provided the function will return the points also in
@@ -141,31 +206,13 @@ def get_preds_fromhm(hm, center=None, scale=None):
         center {torch.tensor} -- the center of the bounding box (default: {None})
         scale {float} -- face scale (default: {None})
     """
-    max, idx = torch.max(
-        hm.view(hm.size(0), hm.size(1), hm.size(2) * hm.size(3)), 2)
-    idx += 1
-    preds = idx.view(idx.size(0), idx.size(1), 1).repeat(1, 1, 2).float()
-    preds[..., 0].apply_(lambda x: (x - 1) % hm.size(3) + 1)
-    preds[..., 1].add_(-1).div_(hm.size(2)).floor_().add_(1)
-
-    for i in range(preds.size(0)):
-        for j in range(preds.size(1)):
-            hm_ = hm[i, j, :]
-            pX, pY = int(preds[i, j, 0]) - 1, int(preds[i, j, 1]) - 1
-            if pX > 0 and pX < 63 and pY > 0 and pY < 63:
-                diff = torch.FloatTensor(
-                    [hm_[pY, pX + 1] - hm_[pY, pX - 1],
-                     hm_[pY + 1, pX] - hm_[pY - 1, pX]])
-                preds[i, j].add_(diff.sign_().mul_(.25))
-
-    preds.add_(-.5)
+    preds = _preds_fromhm(hm)
 
     preds_orig = torch.zeros(preds.size())
     if center is not None and scale is not None:
-        for i in range(hm.size(0)):
-            for j in range(hm.size(1)):
-                preds_orig[i, j] = transform(
-                    preds[i, j], center, scale, hm.size(2), True)
+        matrices = transform_matrices([center], [scale], hm.size(2), True)
+        preds_orig = transform_points(
+            preds, matrices.expand(hm.size(0), 3, 3)).float()
 
     return preds, preds_orig
 
@@ -181,31 +228,12 @@ def get_preds_fromhm_batch(hm, centers=None, scales=None):
         centers {torch.tensor} -- the centers of the bounding box (default: {None})
         scales {float} -- face scales (default: {None})
     """
-    max, idx = torch.max(
-        hm.view(hm.size(0), hm.size(1), hm.size(2) * hm.size(3)), 2)
-    idx += 1
-    preds = idx.view(idx.size(0), idx.size(1), 1).repeat(1, 1, 2).float()
-    preds[..., 0].apply_(lambda x: (x - 1) % hm.size(3) + 1)
-    preds[..., 1].add_(-1).div_(hm.size(2)).floor_().add_(1)
-
-    for i in range(preds.size(0)):
-        for j in range(preds.size(1)):
-            hm_ = hm[i, j, :]
-            pX, pY = int(preds[i, j, 0]) - 1, int(preds[i, j, 1]) - 1
-            if pX > 0 and pX < 63 and pY > 0 and pY < 63:
-                diff = torch.FloatTensor(
-                    [hm_[pY, pX + 1] - hm_[pY, pX - 1],
-                     hm_[pY + 1, pX] - hm_[pY - 1, pX]])
-                preds[i, j].add_(diff.sign_().mul_(.25))
-
-    preds.add_(-.5)
+    preds = _preds_fromhm(hm)
 
     preds_orig = torch.zeros(preds.size())
     if centers is not None and scales is not None:
-        for i in range(hm.size(0)):
-            for j in range(hm.size(1)):
-                preds_orig[i, j] = transform(
-                    preds[i, j], centers[i], scales[i], hm.size(2), True)
+        matrices = transform_matrices(centers, scales, hm.size(2), True)
+        preds_orig = transform_points(preds, matrices).float()
 
     return preds, preds_orig
 
@@ -0,0 +1,125 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class SpeakerLatentStore:
+    """
+    Stores XTTS speaker conditioning latents for reuse across requests and restarts.
+
+    Entries are keyed by the content hash of the reference audio plus the
+    conditioning parameters, kept in a size-bounded in-memory LRU and persisted
+    with torch.save so a fresh process can skip get_conditioning_latents.
+    """
+
+    def __init__(
+        self,
+        cache_dir="latents",
+        max_entries=16,
+        gpt_cond_len=30,
+        gpt_cond_chunk_len=4,
+        max_ref_length=60,
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.gpt_cond_len = gpt_cond_len
+        self.gpt_cond_chunk_len = gpt_cond_chunk_len
+        self.max_ref_length = max_ref_length
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+
+    def _hash_file(self, audio_path):
+        # Reference files rarely change; only re-read them when size or mtime moves
+        stat = os.stat(audio_path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._file_hashes.get(audio_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        sha = hashlib.sha256()
+        with open(audio_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._file_hashes[audio_path] = (stamp, digest)
+        return digest
+
+    def key(self, audio_path):
+        """Returns the cache key for a reference audio file under the current params."""
+        return "{}_{}_{}_{}".format(
+            self._hash_file(audio_path),
+            self.gpt_cond_len,
+            self.gpt_cond_chunk_len,
+            self.max_ref_length,
+        )
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pt")
+
+    def _remember(self, key, latents):
+        self._entries[key] = latents
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, model, audio_path):
+        """
+        Returns (gpt_cond_latent, speaker_embedding) for the given reference audio,
+        computing and persisting them with the XTTS model on a miss.
+        """
+        key = self.key(audio_path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        path = self._path(key)
+        if os.path.isfile(path):
+            saved = torch.load(path, map_location=model.device)
+            latents = (saved["gpt_cond_latent"], saved["speaker_embedding"])
+        else:
+            gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(
+                audio_path=audio_path,
+                gpt_cond_len=self.gpt_cond_len,
+                gpt_cond_chunk_len=self.gpt_cond_chunk_len,
+                max_ref_length=self.max_ref_length,
+            )
+            latents = (gpt_cond_latent, speaker_embedding)
+
+            # Write to a temp file first so a crash never leaves a truncated
+            # entry; per thread, as two requests can miss on the same speaker
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                torch.save(
+                    {
+                        "gpt_cond_latent": gpt_cond_latent.cpu(),
+                        "speaker_embedding": speaker_embedding.cpu(),
+                    },
+                    tmp_path,
+                )
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        with self._lock:
+            self._remember(key, latents)
+        return latents
+
+    def precompute(self, model, audio_paths):
+        """Loads or computes latents for each reference so the first request is warm."""
+        for audio_path in audio_paths:
+            if not os.path.isfile(audio_path):
+                print(f"Speaker reference not found, skipping precompute: {audio_path}")
+                continue
+            self.get(model, audio_path)
+            print(f"Speaker latents ready for {audio_path}")
@@ -0,0 +1,322 @@
+import os
+import time
+import threading
+
+import torch
+from dotenv import load_dotenv
+
+load_dotenv()
+weights_relative_path = os.getenv("MODEL_DIR")
+
+
+def _rss_bytes():
+    """Returns the resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        # Peak rather than current RSS, but the best we have off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _modules(obj, depth=2):
+    """Finds the torch modules an object holds, looking depth attributes deep."""
+    if isinstance(obj, torch.nn.Module):
+        return [obj]
+    if depth == 0:
+        return []
+    return [
+        module
+        for v in getattr(obj, "__dict__", {}).values()
+        for module in _modules(v, depth - 1)
+    ]
+
+
+def _tensor_bytes(obj):
+    """Sums parameter and buffer sizes of a torch module or of the modules an object holds."""
+    # Two levels reach the network inside FaceAlignment's detector wrapper
+    modules = _modules(obj)
+
+    seen = set()
+    total = 0
+    for module in modules:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            if tensor.data_ptr() in seen:
+                continue
+            seen.add(tensor.data_ptr())
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelRegistry:
+    """
+    Loads each heavy model at most once per process and hands out the shared instance.
+
+    Loaders are registered by name and only run on the first get(); concurrent
+    callers for the same model wait on that single load.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._error = None
+
+    def register(self, name, loader):
+        """Registers (or replaces, if not yet loaded) the loader for a model."""
+        with self._lock:
+            if name in self._models:
+                raise RuntimeError(f"Model '{name}' is already loaded")
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"No loader registered for model '{name}'")
+            lock = self._locks[name]
+
+        with lock:
+            if name not in self._models:
+                rss_before = _rss_bytes()
+                start_time = time.time()
+                model = self._loaders[name]()
+                load_time = time.time() - start_time
+                self._stats[name] = {
+                    "load_seconds": round(load_time, 2),
+                    "rss_delta_bytes": _rss_bytes() - rss_before,
+                }
+                self._models[name] = model
+                print(f"Loaded model '{name}' in {load_time:.1f}s")
+        return self._models[name]
+
+    def load_in_background(self, names, warmup=None):
+        """
+        Loads the named models and then runs warmup on a daemon thread, so the
+        caller (typically server import) returns immediately. ready() turns true
+        once everything has loaded and warmed up.
+        """
+
+        def _load():
+            try:
+                for name in names:
+                    self.get(name)
+                if warmup is not None:
+                    start_time = time.time()
+                    warmup()
+                    print(f"Warmup finished in {time.time() - start_time:.1f}s")
+                self._ready.set()
+            except Exception as e:
+                self._error = e
+                print(f"Model loading failed: {e}")
+
+        thread = threading.Thread(target=_load, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def ready(self):
+        return self._ready.is_set()
+
+    def status(self):
+        return {
+            "ready": self.ready(),
+            "error": None if self._error is None else str(self._error),
+            "loaded": sorted(self._models),
+        }
+
+    def memory_report(self):
+        """Describes which models are resident and roughly how much memory each holds."""
+        models = {}
+        for name, model in list(self._models.items()):
+            entry = dict(self._stats[name])
+            entry["tensor_bytes"] = _tensor_bytes(model)
+            models[name] = entry
+        return {
+            "rss_bytes": _rss_bytes(),
+            "registered": sorted(self._loaders),
+            "models": models,
+        }
+
+
+def load_whisper(model_path=None, **kwargs):
+    from faster_whisper import WhisperModel
+
+    # large-v3 seems to have a problem
+    if model_path is None:
+        model_path = f"{weights_relative_path}/faster-whisper-v3"
+    # num_workers lets that many transcription threads run in parallel
+    options = {
+        "device": os.getenv("WHISPER_DEVICE", "auto"),
+        "compute_type": os.getenv("WHISPER_COMPUTE_TYPE", "int8"),
+        "cpu_threads": int(os.getenv("WHISPER_CPU_THREADS", "0")),
+        "num_workers": int(os.getenv("WHISPER_NUM_WORKERS", "1")),
+    }
+    options.update(kwargs)
+    return WhisperModel(model_path, **options)
+
+
+def load_xtts(model_dir=None, use_deepspeed=True, int8=None):
+    """
+    Loads XTTS v2 onto the GPU when there is one. With int8 (default from
+    XTTS_INT8=1) it instead serves the model on the CPU with a dynamically
+    quantized GPT. The first run quantizes model.pth and saves the result to
+    XTTS_INT8_PATH; later runs load only that file, skipping the fp32 GPT
+    weights and the quantization pass.
+    """
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.models.xtts import Xtts
+    import xtts_quant
+
+    # Set environment variable for Coqui TTS agreement
+    os.environ["COQUI_TOS_AGREED"] = "1"
+
+    if model_dir is None:
+        model_dir = f"{weights_relative_path}/coqui-xtts-v2"
+    config_path = os.path.join(model_dir, "config.json")
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"Model configuration file not found at: {config_path}")
+
+    if int8 is None:
+        int8 = os.getenv("XTTS_INT8", "0") == "1"
+    int8_path = os.getenv("XTTS_INT8_PATH", os.path.join(model_dir, "model_int8.pth"))
+
+    print("Model config file found. Proceeding with model initialization.")
+    config = XttsConfig()
+    config.load_json(config_path)
+    xtts_model = Xtts.init_from_config(config)
+    if int8 and os.path.exists(int8_path):
+        print(f"Loading int8 XTTS from {int8_path}")
+        # The artifact has no fp32 GPT weights, so the GPT keeps its initial
+        # ones until load_quantized restores the int8 GPT into it
+        xtts_model.load_checkpoint(
+            config,
+            checkpoint_path=int8_path,
+            vocab_path=os.path.join(model_dir, "vocab.json"),
+            checkpoint_dir=model_dir,
+            eval=True,
+            strict=False,
+            use_deepspeed=False,
+        )
+        xtts_quant.load_quantized(xtts_model, int8_path)
+    else:
+        xtts_model.load_checkpoint(
+            config,
+            checkpoint_path=os.path.join(model_dir, "model.pth"),
+            vocab_path=os.path.join(model_dir, "vocab.json"),
+            checkpoint_dir=model_dir,
+            eval=True,
+            use_deepspeed=use_deepspeed and not int8,
+        )
+        if int8:
+            xtts_quant.quantize_xtts(xtts_model)
+            xtts_quant.save_quantized(xtts_model, int8_path)
+            print(f"Saved int8 XTTS to {int8_path}")
+    print("CUDA Available:", torch.cuda.is_available())
+
+    if int8:
+        # Quantized kernels only run on the CPU
+        xtts_model.to("cpu")
+    else:
+        xtts_model.to("cuda" if torch.cuda.is_available() else "cpu")
+
+    if os.getenv("XTTS_PREFIX_CACHE", "1") == "1":
+        from xtts_prefix_cache import SpeakerPrefixCache
+
+        # Kept on the model so warmup can precompute the main speaker's prefix
+        xtts_model.prefix_cache = SpeakerPrefixCache(xtts_model)
+        if not xtts_model.prefix_cache.install():
+            xtts_model.prefix_cache = None
+    return xtts_model
+
+
+def _face_detector_options():
+    return {
+        # haar (OpenCV cascade, the default), or opt in to sfd (S3FD, more
+        # recall; downloads s3fd.pth if it is missing) or yunet (OpenCV DNN)
+        "detector_backend": os.getenv("WAV2LIP_FACE_DETECTOR", "haar"),
+        # Expected avatar face size range in px; lets SFD downscale frames and
+        # skip detection heads for faces outside it
+        "min_face_size": (
+            int(os.getenv("WAV2LIP_MIN_FACE_SIZE"))
+            if os.getenv("WAV2LIP_MIN_FACE_SIZE")
+            else None
+        ),
+        "max_face_size": (
+            int(os.getenv("WAV2LIP_MAX_FACE_SIZE"))
+            if os.getenv("WAV2LIP_MAX_FACE_SIZE")
+            else None
+        ),
+        # torch, onnx or int8; the ONNX variants need sfd_export.py run first
+        "sfd_backend": os.getenv("WAV2LIP_SFD_BACKEND", "torch"),
+    }
+
+
+def load_face_detector():
+    """
+    Loads the face_detection detector selected by WAV2LIP_FACE_DETECTOR. The
+    Haar cascade is not an entry: it is tiny, and Processor keeps one per
+    request thread because it can't be called concurrently.
+    """
+    from Wav2Lip import build_face_detector
+
+    options = _face_detector_options()
+    if options["detector_backend"] == "haar":
+        raise ValueError("The haar detector is loaded per thread by Processor")
+    # Same device choice as Processor: quantized Wav2Lip keeps everything on the CPU
+    if os.getenv("WAV2LIP_BACKEND", "torch") != "int8" and torch.cuda.is_available():
+        device = "cuda"
+    else:
+        device = "cpu"
+    return build_face_detector(device=device, **options)
+
+
+def load_wav2lip():
+    from Wav2Lip import Processor
+
+    silence_db = os.getenv("WAV2LIP_SILENCE_DB", "-85")
+    # torch, torchscript, onnx or int8; exported backends need wav2lip_export.py
+    # (or wav2lip_quant.py for int8) run first
+    processor = Processor(
+        backend=os.getenv("WAV2LIP_BACKEND", "torch"),
+        channels_last=os.getenv("WAV2LIP_CHANNELS_LAST", "0") == "1",
+        # Falls back to fp32 on CPUs without native bf16
+        bf16=os.getenv("WAV2LIP_BF16", "0") == "1",
+        # Still-avatar windows quieter than this (mel dB) get a cached closed
+        # mouth instead of a generator pass; "off" disables. The mel scale bottoms out at -100 for
+        # digital silence, white noise at -60 dBFS RMS reads about -87, and
+        # speech windows of trump.wav never go below about -82, so -85 only
+        # catches pauses under a roughly -60 dBFS noise floor
+        silence_db=None if silence_db == "off" else float(silence_db),
+        frame_stride=int(os.getenv("WAV2LIP_FRAME_STRIDE", "1")),
+        detector_memory_mb=(
+            int(os.getenv("WAV2LIP_DETECTOR_MEMORY_MB"))
+            if os.getenv("WAV2LIP_DETECTOR_MEMORY_MB")
+            else None
+        ),
+        **_face_detector_options(),
+    )
+    processor.model = processor.load_model(processor.checkpoint_path)
+    # The shared face detector, loaded up front; haar cascades load per thread
+    if processor.detector_backend != "haar":
+        processor.face_detector = registry.get("face_detector")
+    return processor
+
+
+# Process-wide registry shared by every endpoint in api.py and api2.py
+registry = ModelRegistry()
+registry.register("whisper", load_whisper)
+registry.register("xtts", load_xtts)
+registry.register("face_detector", load_face_detector)
+registry.register("wav2lip", load_wav2lip)
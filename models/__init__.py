@@ -1,2 +1,3 @@
 from .wav2lip import Wav2Lip, Wav2Lip_disc_qual
-from .syncnet import SyncNet_color
\ No newline at end of file
+from .syncnet import SyncNet_color
+from .fuse import fuse_for_inference
\ No newline at end of file
@@ -0,0 +1,53 @@
+import copy
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from .conv import Conv2d, Conv2dTranspose
+
+class FusedConv2d(nn.Module):
+    """Inference-only Conv2d block with its BatchNorm folded into the conv weights."""
+    def __init__(self, block):
+        super().__init__()
+        conv, bn = block.conv_block
+        self.conv = fuse_conv_bn_eval(conv, bn)
+        self.residual = block.residual
+
+    def forward(self, x):
+        out = self.conv(x)
+        if self.residual:
+            out += x
+        # out is a fresh tensor, so the ReLU can run in place
+        return F.relu(out, inplace=True)
+
+class FusedConv2dTranspose(nn.Module):
+    """Inference-only Conv2dTranspose block with its BatchNorm folded into the weights."""
+    def __init__(self, block):
+        super().__init__()
+        conv, bn = block.conv_block
+        self.conv = fuse_conv_bn_eval(conv, bn, transpose=True)
+
+    def forward(self, x):
+        return F.relu(self.conv(x), inplace=True)
+
+def _fuse_children(module):
+    for name, child in module.named_children():
+        if isinstance(child, Conv2d):
+            setattr(module, name, FusedConv2d(child))
+        elif isinstance(child, Conv2dTranspose):
+            setattr(module, name, FusedConv2dTranspose(child))
+        else:
+            _fuse_children(child)
+
+@torch.no_grad()
+def fuse_for_inference(model):
+    """
+    Returns an eval-mode copy of model where every Conv2d and Conv2dTranspose
+    block runs as a single convolution followed by an in-place ReLU.
+    The copy can't be trained, since the BatchNorm statistics are baked in.
+    """
+    model = copy.deepcopy(model).eval()
+    _fuse_children(model)
+    return model
@@ -84,17 +84,12 @@ class Wav2Lip(nn.Module):
             nn.Conv2d(32, 3, kernel_size=1, stride=1, padding=0),
             nn.Sigmoid()) 
 
-    def forward(self, audio_sequences, face_sequences):
-        # audio_sequences = (B, T, 1, 80, 16)
-        B = audio_sequences.size(0)
-
-        input_dim_size = len(face_sequences.size())
-        if input_dim_size > 4:
-            audio_sequences = torch.cat([audio_sequences[:, i] for i in range(audio_sequences.size(1))], dim=0)
-            face_sequences = torch.cat([face_sequences[:, :, i] for i in range(face_sequences.size(2))], dim=0)
-
-        audio_embedding = self.audio_encoder(audio_sequences) # B, 512, 1, 1
+    def encode_audio(self, audio_sequences):
+        # audio_sequences = (B, 1, 80, 16)
+        return self.audio_encoder(audio_sequences) # B, 512, 1, 1
 
+    def decode(self, audio_embedding, face_sequences):
+        # Generates faces from precomputed audio embeddings, (B, 512, 1, 1)
         feats = []
         x = face_sequences
         for f in self.face_encoder_blocks:
@@ -113,7 +108,18 @@ class Wav2Lip(nn.Module):
             
             feats.pop()
 
-        x = self.output_block(x)
+        return self.output_block(x)
+
+    def forward(self, audio_sequences, face_sequences):
+        # audio_sequences = (B, T, 1, 80, 16)
+        B = audio_sequences.size(0)
+
+        input_dim_size = len(face_sequences.size())
+        if input_dim_size > 4:
+            audio_sequences = torch.cat([audio_sequences[:, i] for i in range(audio_sequences.size(1))], dim=0)
+            face_sequences = torch.cat([face_sequences[:, :, i] for i in range(face_sequences.size(2))], dim=0)
+
+        x = self.decode(self.encode_audio(audio_sequences), face_sequences)
 
         if input_dim_size > 4:
             x = torch.split(x, B, dim=0) # [(B, C, H, W)]
@@ -0,0 +1,186 @@
+"""
+Exports the S3FD face detector to ONNX, optionally quantizes it to int8
+with ONNX Runtime static quantization calibrated on face images, and
+validates both against the eager model by box IoU.
+
+    python sfd_export.py --int8 --images trump.jpg trump1.jpeg biden2.jpeg
+
+Outputs land next to s3fd.pth (s3fd.onnx / s3fd_int8.onnx), which is where
+SFDDetector(backend="onnx" | "int8") looks for them. Batch, height and width
+are dynamic. --min-face-size/--max-face-size export only the detection
+heads SFDDetector would keep for that range and record it in the ONNX
+metadata; SFDDetector refuses bounds that would need different heads.
+"""
+
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+import torch
+from torch import nn
+
+from face_detection.detection.sfd.onnx_s3fd import exported_path, output_names, write_metadata
+from face_detection.detection.sfd.sfd_detector import SFDDetector
+
+DEFAULT_DETECTOR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "face_detection", "detection", "sfd", "s3fd.pth"
+)
+# ONNX Runtime keeps every activation of every calibration run in memory,
+# so calibration images are capped to this longer side
+CALIBRATION_SIZE = 640
+
+
+class _ActiveHeads(nn.Module):
+    """s3fd returning only its active heads' outputs, which ONNX needs as a flat tuple."""
+
+    def __init__(self, net):
+        super().__init__()
+        self.net = net
+
+    def forward(self, x):
+        return tuple(output for output in self.net(x) if output is not None)
+
+
+def export_onnx(detector, path):
+    net = detector.face_detector.cpu()
+    names = output_names(net.active_heads)
+    dynamic_axes = {name: {0: "batch", 2: "height", 3: "width"} for name in ["image"] + names}
+    torch.onnx.export(
+        _ActiveHeads(net),
+        torch.rand(1, 3, 256, 256),
+        path,
+        input_names=["image"],
+        output_names=names,
+        dynamic_axes=dynamic_axes,
+        opset_version=18,
+    )
+
+
+def load_image(path, max_size):
+    """An RGB image, as SFDDetector receives frames, downscaled to max_size if larger."""
+    image = cv2.imread(path)[..., ::-1]
+    height, width = image.shape[:2]
+    if max(height, width) > max_size:
+        scale = max_size / max(height, width)
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def preprocess(detector, image):
+    """An image as detect() feeds it to the network: mean-subtracted NCHW."""
+    if detector.input_scale < 1:
+        image = detector._resize(image)
+    image = image - np.array([104, 117, 123])
+    return image.transpose(2, 0, 1)[None].astype(np.float32)
+
+
+def quantize_int8(onnx_path, int8_path, calibration_images):
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    class FaceImages(CalibrationDataReader):
+        def __init__(self):
+            # Each image and its mirror, so activation ranges see both poses
+            inputs = []
+            for image in calibration_images:
+                inputs += [image, np.ascontiguousarray(image[..., ::-1])]
+            self.inputs = iter(inputs)
+
+        def get_next(self):
+            image = next(self.inputs, None)
+            return None if image is None else {"image": image}
+
+    quantize_static(
+        onnx_path,
+        int8_path,
+        FaceImages(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def detect_timed(detector, image):
+    start_time = time.time()
+    bboxlist = detector.detect_from_image(image)
+    return bboxlist, time.time() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export S3FD to ONNX (and int8) and validate by IoU")
+    parser.add_argument("--detector", default=DEFAULT_DETECTOR, help="S3FD checkpoint (.pth)")
+    parser.add_argument("--images", nargs="+", default=["trump.jpg", "trump1.jpeg", "trump2.jpeg", "biden2.jpeg"],
+                        help="Face images to calibrate and validate on")
+    parser.add_argument("--int8", action="store_true", help="Also write an int8 model")
+    parser.add_argument("--min-face-size", type=int, default=None)
+    parser.add_argument("--max-face-size", type=int, default=None)
+    parser.add_argument("--min-iou", type=float, default=0.9, help="Min IoU of each image's top box vs eager")
+    parser.add_argument("--max-size", type=int, default=1280, help="Downscale larger validation images to this")
+    args = parser.parse_args()
+
+    options = {"min_face_size": args.min_face_size, "max_face_size": args.max_face_size}
+    eager = SFDDetector("cpu", path_to_detector=args.detector, **options)
+
+    backends = ["onnx"]
+    export_onnx(eager, exported_path(args.detector, "onnx"))
+    if args.int8:
+        backends.append("int8")
+        quantize_int8(
+            exported_path(args.detector, "onnx"),
+            exported_path(args.detector, "int8"),
+            [preprocess(eager, load_image(path, CALIBRATION_SIZE)) for path in args.images],
+        )
+    for backend in backends:
+        # SFDDetector checks these against the bounds it is given at runtime
+        write_metadata(exported_path(args.detector, backend), eager.face_detector.active_heads, **options)
+        print(f"Exported {backend} to {exported_path(args.detector, backend)}")
+
+    detectors = {"torch": eager}
+    for backend in backends:
+        detectors[backend] = SFDDetector("cpu", path_to_detector=args.detector, backend=backend, **options)
+
+    failed = False
+    seconds = {backend: 0.0 for backend in detectors}
+    for path in args.images:
+        image = load_image(path, args.max_size)
+        results = {}
+        for backend, detector in detectors.items():
+            detector.detect_from_image(image)
+            results[backend], elapsed = detect_timed(detector, image)
+            seconds[backend] += elapsed
+
+        expected = results["torch"]
+        for backend in backends:
+            bboxlist = results[backend]
+            if not expected or not bboxlist:
+                score = 1.0 if len(expected) == len(bboxlist) else 0.0
+            else:
+                score = iou(expected[0], bboxlist[0])
+            status = "ok" if score >= args.min_iou else "MISMATCH"
+            failed = failed or score < args.min_iou
+            print(f"{path} {backend}: {len(bboxlist)} faces (torch {len(expected)}), top box IoU {score:.3f} {status}")
+
+    for backend, total in seconds.items():
+        print(f"{backend}: {total / len(args.images) * 1000:.1f} ms/image")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
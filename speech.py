@@ -0,0 +1,44 @@
+import numpy as np
+
+# XTTS v2 always vocodes at this rate
+XTTS_SAMPLE_RATE = 24000
+
+
+def sampling_params(xtts_model):
+    """Returns the model config's default sampling settings, as the TTS API uses them."""
+    config = xtts_model.config
+    return {
+        "temperature": config.temperature,
+        "length_penalty": config.length_penalty,
+        "repetition_penalty": config.repetition_penalty,
+        "top_k": config.top_k,
+        "top_p": config.top_p,
+    }
+
+
+def synthesize_stream(
+    xtts_model,
+    text,
+    language,
+    gpt_cond_latent,
+    speaker_embedding,
+    stream_chunk_size=20,
+    **params,
+):
+    """
+    Yields float32 waveform chunks at XTTS_SAMPLE_RATE as XTTS decodes them,
+    so playback and lip-sync can start after the first chunk instead of the
+    whole utterance.
+    """
+    params = {**sampling_params(xtts_model), **params}
+    chunks = xtts_model.inference_stream(
+        text,
+        language,
+        gpt_cond_latent,
+        speaker_embedding,
+        stream_chunk_size=stream_chunk_size,
+        enable_text_splitting=True,
+        **params,
+    )
+    for chunk in chunks:
+        yield chunk.cpu().numpy().astype(np.float32)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import audio
+
+
+def tone(sample_rate, seconds):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    rng = np.random.default_rng(0)
+    wav = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t))
+    return (wav + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+@pytest.mark.parametrize("sample_rate", [16000, 24000])
+@pytest.mark.parametrize("chunk_sizes", [[4800], [1000, 7777, 333, 24000], [10 ** 6]])
+def test_mel_stream_matches_melspectrogram(sample_rate, chunk_sizes):
+    wav = tone(sample_rate, 2.0)
+    expected = audio.melspectrogram(audio.resample(wav, sample_rate, 16000))
+
+    stream = audio.MelStream(sample_rate)
+    parts = []
+    i = 0
+    while i < len(wav):
+        size = chunk_sizes[len(parts) % len(chunk_sizes)]
+        parts.append(stream.push(wav[i : i + size]))
+        i += size
+    parts.append(stream.push(np.zeros(0, dtype=np.float32), last=True))
+    mel = np.concatenate(parts, axis=1)
+
+    assert mel.shape == expected.shape
+    np.testing.assert_allclose(mel, expected, atol=1e-4)
+
+
+def test_mel_stream_only_returns_frames_clear_of_the_end():
+    stream = audio.MelStream(16000)
+    # 1000 samples: windows centred up to sample 600 lie fully inside
+    assert stream.push(np.zeros(1000, dtype=np.float32)).shape == (80, 4)
+    assert stream.push(np.zeros(199, dtype=np.float32)).shape == (80, 0)
+    assert stream.push(np.zeros(1, dtype=np.float32)).shape == (80, 1)
+    # Flushing pads the end like melspectrogram: 1 + 1200 // 200 frames in all
+    assert stream.push(np.zeros(0, dtype=np.float32), last=True).shape == (80, 2)
+    assert stream.num_frames == 7
@@ -0,0 +1,47 @@
+import shutil
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import audio_stream
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+
+
+def tone_chunks(count, state, delay=0.0):
+    try:
+        for _ in range(count):
+            time.sleep(delay)
+            state["pulled"] += 1
+            yield 0.3 * np.sin(np.arange(4800, dtype=np.float32) / 5)
+    finally:
+        state["closed"] = True
+
+
+@pytest.mark.parametrize("stream_format", sorted(audio_stream.STREAM_FORMATS))
+def test_encodes_all_chunks(stream_format):
+    state = {"pulled": 0, "closed": False}
+    data = b"".join(
+        audio_stream.encode_stream(tone_chunks(5, state), stream_format=stream_format)
+    )
+
+    assert len(data) > 0
+    assert state == {"pulled": 5, "closed": True}
+
+
+def test_abandoned_stream_stops_pulling_chunks():
+    state = {"pulled": 0, "closed": False}
+    stream = audio_stream.encode_stream(tone_chunks(1000, state, delay=0.05), read_size=1)
+    next(stream)
+
+    start = time.time()
+    stream.close()
+    assert time.time() - start < 2
+
+    pulled = state["pulled"]
+    time.sleep(0.3)
+    assert state["closed"]
+    assert state["pulled"] == pulled < 1000
+    assert not any(t.name == "audio-encoder" for t in threading.enumerate())
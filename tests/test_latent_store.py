@@ -0,0 +1,129 @@
+import os
+import threading
+
+import pytest
+import torch
+
+from latent_store import SpeakerLatentStore
+
+
+class FakeXtts:
+    device = "cpu"
+
+    def __init__(self):
+        self.calls = []
+
+    def get_conditioning_latents(self, audio_path, gpt_cond_len, gpt_cond_chunk_len, max_ref_length):
+        self.calls.append(audio_path)
+        seed = float(len(self.calls))
+        return torch.full((1, 32, 1024), seed), torch.full((1, 512, 1), seed)
+
+
+def write_ref(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_get_computes_once_then_hits_memory(tmp_path):
+    store = SpeakerLatentStore(cache_dir=str(tmp_path / "latents"))
+    model = FakeXtts()
+    ref = write_ref(tmp_path, "a.wav", b"aaa")
+
+    first = store.get(model, ref)
+    second = store.get(model, ref)
+
+    assert model.calls == [ref]
+    assert second is first
+
+
+def test_lru_evicts_oldest_but_keeps_disk_tier(tmp_path):
+    store = SpeakerLatentStore(cache_dir=str(tmp_path / "latents"), max_entries=2)
+    model = FakeXtts()
+    refs = [write_ref(tmp_path, f"{name}.wav", name.encode()) for name in "abc"]
+
+    for ref in refs:
+        store.get(model, ref)
+    assert list(store._entries) == [store.key(refs[1]), store.key(refs[2])]
+
+    # Evicted from memory, but reloaded from its .pt file without the model
+    gpt_cond_latent, _ = store.get(model, refs[0])
+    assert len(model.calls) == 3
+    assert gpt_cond_latent[0, 0, 0].item() == 1.0
+    assert list(store._entries) == [store.key(refs[2]), store.key(refs[0])]
+
+
+def test_latents_survive_a_restart(tmp_path):
+    cache_dir = str(tmp_path / "latents")
+    ref = write_ref(tmp_path, "a.wav", b"aaa")
+    SpeakerLatentStore(cache_dir=cache_dir).get(FakeXtts(), ref)
+
+    model = FakeXtts()
+    gpt_cond_latent, speaker_embedding = SpeakerLatentStore(cache_dir=cache_dir).get(model, ref)
+
+    assert model.calls == []
+    assert gpt_cond_latent.shape == (1, 32, 1024)
+    assert speaker_embedding.shape == (1, 512, 1)
+
+
+def test_key_follows_content_and_params(tmp_path):
+    store = SpeakerLatentStore(cache_dir=str(tmp_path / "latents"))
+    a = write_ref(tmp_path, "a.wav", b"same")
+    b = write_ref(tmp_path, "b.wav", b"same")
+    c = write_ref(tmp_path, "c.wav", b"other")
+
+    assert store.key(a) == store.key(b)
+    assert store.key(a) != store.key(c)
+    other = SpeakerLatentStore(cache_dir=str(tmp_path / "latents"), gpt_cond_len=6)
+    assert other.key(a) != store.key(a)
+
+
+def test_failed_save_leaves_no_entry(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "latents"
+    store = SpeakerLatentStore(cache_dir=str(cache_dir))
+    ref = write_ref(tmp_path, "a.wav", b"aaa")
+
+    def crash(obj, path):
+        with open(path, "wb") as f:
+            f.write(b"trunc")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(torch, "save", crash)
+    with pytest.raises(OSError):
+        store.get(FakeXtts(), ref)
+
+    assert os.listdir(cache_dir) == []
+    assert store._entries == {}
+
+
+def test_concurrent_misses_write_separate_temp_files(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "latents"
+    store = SpeakerLatentStore(cache_dir=str(cache_dir))
+    ref = write_ref(tmp_path, "a.wav", b"aaa")
+    model = FakeXtts()
+    barrier = threading.Barrier(4)
+    compute = model.get_conditioning_latents
+
+    def slow_compute(**kwargs):
+        # All threads miss before any of them writes
+        barrier.wait(timeout=5)
+        return compute(**kwargs)
+
+    saved_to = []
+    save = torch.save
+
+    def record_save(obj, path):
+        saved_to.append(path)
+        save(obj, path)
+
+    model.get_conditioning_latents = slow_compute
+    monkeypatch.setattr(torch, "save", record_save)
+    threads = [threading.Thread(target=store.get, args=(model, ref)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(model.calls) == 4
+    assert len(set(saved_to)) == 4
+    assert os.listdir(cache_dir) == [f"{store.key(ref)}.pt"]
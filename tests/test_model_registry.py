@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+import torch
+
+from model_registry import ModelRegistry
+
+
+def test_get_loads_once_across_threads():
+    registry = ModelRegistry()
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    registry.register("model", load)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get("model")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len({id(model) for model in results}) == 1
+    assert registry.is_loaded("model")
+
+
+def test_get_unknown_model_raises():
+    with pytest.raises(KeyError):
+        ModelRegistry().get("missing")
+
+
+def test_register_after_load_raises():
+    registry = ModelRegistry()
+    registry.register("model", object)
+    registry.get("model")
+
+    with pytest.raises(RuntimeError):
+        registry.register("model", object)
+
+
+def test_background_load_turns_ready_after_warmup():
+    registry = ModelRegistry()
+    registry.register("a", object)
+    registry.register("b", object)
+    warmed = []
+
+    assert registry.status() == {"ready": False, "error": None, "loaded": []}
+    registry.load_in_background(["a", "b"], warmup=lambda: warmed.append(1)).join()
+
+    assert warmed == [1]
+    assert registry.ready()
+    assert registry.status() == {"ready": True, "error": None, "loaded": ["a", "b"]}
+
+
+def test_background_load_failure_is_reported():
+    registry = ModelRegistry()
+    registry.register("good", object)
+
+    def broken():
+        raise FileNotFoundError("no checkpoint")
+
+    registry.register("broken", broken)
+    registry.load_in_background(["good", "broken"]).join()
+
+    status = registry.status()
+    assert not registry.ready()
+    assert status["error"] == "no checkpoint"
+    assert status["loaded"] == ["good"]
+
+
+def test_memory_report_counts_held_modules_once():
+    class Holder:
+        def __init__(self):
+            self.net = torch.nn.Linear(10, 10)
+            # Same module reachable twice, e.g. a wrapper around the network
+            self.wrapper = type("Wrapper", (), {})()
+            self.wrapper.net = self.net
+
+    registry = ModelRegistry()
+    registry.register("holder", Holder)
+    registry.get("holder")
+
+    report = registry.memory_report()
+    assert report["registered"] == ["holder"]
+    assert report["models"]["holder"]["tensor_bytes"] == (10 * 10 + 10) * 4
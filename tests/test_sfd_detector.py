@@ -0,0 +1,68 @@
+import pytest
+
+from face_detection.detection.sfd.onnx_s3fd import exported_path, write_metadata
+from face_detection.detection.sfd.sfd_detector import SFDDetector
+
+
+@pytest.mark.parametrize(
+    "min_face_size, max_face_size, heads",
+    [
+        (None, None, [0, 1, 2, 3, 4, 5]),
+        # Anchors are 16-512 px; keep heads within a factor of two of the range
+        (64, 128, [1, 2, 3, 4]),
+        (64, None, [1, 2, 3, 4, 5]),
+        (None, 100, [0, 1, 2, 3]),
+        # The end heads stay on for faces past the anchors
+        (None, 4, [0]),
+        (5000, None, [5]),
+    ],
+)
+def test_heads_for_face_sizes(min_face_size, max_face_size, heads):
+    assert SFDDetector.heads_for_face_sizes(min_face_size, max_face_size) == heads
+
+
+def test_heads_for_face_sizes_never_empty():
+    for min_face_size in (1, 16, 100, 1000, 10000):
+        for max_face_size in (min_face_size, min_face_size * 4):
+            assert SFDDetector.heads_for_face_sizes(min_face_size, max_face_size)
+
+
+def export_heads(path, active_heads):
+    """A stand-in export: one Identity output per active head's cls/reg tensor."""
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from onnx import TensorProto, helper
+
+    outputs, nodes = [], []
+    for i in active_heads:
+        for name in ("cls%d" % (i + 1), "reg%d" % (i + 1)):
+            nodes.append(helper.make_node("Identity", ["image"], [name]))
+            outputs.append(helper.make_tensor_value_info(name, TensorProto.FLOAT, None))
+    image = helper.make_tensor_value_info("image", TensorProto.FLOAT, [1, 3, 8, 8])
+    graph = helper.make_graph(nodes, "s3fd", [image], outputs)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 18)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    path = str(tmp_path / "s3fd.pth")
+    active_heads = SFDDetector.heads_for_face_sizes(64, 128)
+    export_heads(exported_path(path, "onnx"), active_heads)
+    write_metadata(exported_path(path, "onnx"), active_heads, min_face_size=200, max_face_size=400)
+    return path
+
+
+def test_onnx_backend_accepts_export_bounds(checkpoint):
+    detector = SFDDetector("cpu", path_to_detector=checkpoint, backend="onnx",
+                           min_face_size=200, max_face_size=400)
+
+    assert detector.face_detector.active_heads == [1, 2, 3, 4]
+    assert detector.face_detector.min_face_size == 200
+    assert detector.face_detector.max_face_size == 400
+
+
+def test_onnx_backend_rejects_bounds_needing_other_heads(checkpoint):
+    with pytest.raises(ValueError, match="min_face_size=200, max_face_size=400"):
+        SFDDetector("cpu", path_to_detector=checkpoint, backend="onnx")
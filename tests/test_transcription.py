@@ -0,0 +1,169 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+transcription = pytest.importorskip("transcription")
+
+
+def test_key_follows_content_and_word_timestamps():
+    cache = transcription.TranscriptCache()
+    assert cache.key(b"audio", False) == cache.key(bytes(b"audio"), False)
+    assert cache.key(b"audio", False) != cache.key(b"other", False)
+    assert cache.key(b"audio", False) != cache.key(b"audio", True)
+
+
+def test_get_returns_stored_result():
+    cache = transcription.TranscriptCache()
+    key = cache.key(b"audio", False)
+    result = {"language": "en", "segments": [{"start": "0.00", "end": "1.00", "text": "Hi"}]}
+
+    assert cache.get(key) is None
+    cache.put(key, result)
+    assert cache.get(key) == result
+
+
+def test_evicts_least_recently_used():
+    cache = transcription.TranscriptCache(max_entries=2)
+    cache.put("a", {"language": "en", "segments": []})
+    cache.put("b", {"language": "de", "segments": []})
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", {"language": "fr", "segments": []})
+
+    assert cache.get("b") is None
+    assert cache.get("a")["language"] == "en"
+    assert cache.get("c")["language"] == "fr"
+
+
+def test_put_replaces_an_existing_entry():
+    cache = transcription.TranscriptCache(max_entries=2)
+    cache.put("a", {"language": "en", "segments": []})
+    cache.put("a", {"language": "de", "segments": []})
+    cache.put("b", {"language": "fr", "segments": []})
+
+    assert cache.get("a")["language"] == "de"
+    assert cache.get("b") is not None
+
+
+class FakeWhisper:
+    """Labels each clip's result with its first sample and records the calls."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+        self.singles = []
+        self.lock = threading.Lock()
+
+    def result(self, audio):
+        return {"language": "en", "segments": [{"text": str(int(audio[0]))}]}
+
+    def transcribe(self, audio, word_timestamps):
+        with self.lock:
+            self.singles.append(int(audio[0]))
+        if self.error:
+            raise self.error
+        return self.result(audio)
+
+    def transcribe_batch(self, audios):
+        with self.lock:
+            self.batches.append(sorted(int(audio[0]) for audio in audios))
+        if self.error:
+            raise self.error
+        return [self.result(audio) for audio in audios]
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    model = FakeWhisper()
+    monkeypatch.setattr(
+        transcription,
+        "transcribe",
+        lambda whisper_model, audio, word_timestamps=False: whisper_model.transcribe(
+            audio, word_timestamps
+        ),
+    )
+    monkeypatch.setattr(
+        transcription,
+        "transcribe_batch",
+        lambda whisper_model, audios: whisper_model.transcribe_batch(audios),
+    )
+    return model
+
+
+def clip(label, seconds=1):
+    return np.full(seconds * transcription.WHISPER_SAMPLE_RATE, label, dtype=np.float32)
+
+
+def submit_together(service, requests):
+    """
+    Calls service.transcribe for every (audio, word_timestamps) at once and
+    returns what each call returned or raised.
+    """
+    outcomes = [None] * len(requests)
+
+    def call(i, request):
+        try:
+            outcomes[i] = service.transcribe(*request)
+        except Exception as e:
+            outcomes[i] = e
+
+    # Daemon threads, so a caller that never gets its result fails the test
+    # instead of hanging the suite
+    threads = [
+        threading.Thread(target=call, args=(i, request), daemon=True)
+        for i, request in enumerate(requests)
+    ]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 10
+    for thread in threads:
+        thread.join(timeout=max(0, deadline - time.monotonic()))
+    assert not any(thread.is_alive() for thread in threads), "caller left waiting"
+    return outcomes
+
+
+def text_of(result):
+    return result["segments"][0]["text"]
+
+
+def test_concurrent_requests_are_batched_and_routed(fake_whisper):
+    service = transcription.TranscriptionService(
+        lambda: fake_whisper, max_batch_size=4, max_wait_ms=1000
+    )
+
+    results = submit_together(service, [(clip(i), False) for i in range(4)])
+
+    assert [text_of(result) for result in results] == ["0", "1", "2", "3"]
+    assert fake_whisper.batches == [[0, 1, 2, 3]]
+    assert service.stats()["batched_requests"] == 4
+
+
+def test_unbatchable_requests_run_alone(fake_whisper):
+    service = transcription.TranscriptionService(
+        lambda: fake_whisper, max_batch_size=4, max_wait_ms=200
+    )
+
+    # Word timestamps and clips over 30 s need the full transcribe() path
+    requests = [(clip(0), False), (clip(1), True), (clip(2, seconds=31), False), (clip(3), False)]
+    results = submit_together(service, requests)
+
+    assert [text_of(result) for result in results] == ["0", "1", "2", "3"]
+    assert sorted(fake_whisper.singles + sum(fake_whisper.batches, [])) == [0, 1, 2, 3]
+    assert 1 in fake_whisper.singles and 2 in fake_whisper.singles
+
+
+def test_model_errors_reach_every_waiting_caller(fake_whisper):
+    service = transcription.TranscriptionService(
+        lambda: fake_whisper, max_batch_size=3, max_wait_ms=1000
+    )
+    fake_whisper.error = RuntimeError("out of memory")
+
+    requests = [(clip(0), False), (clip(1), False), (clip(2), False), (clip(3), True)]
+    for outcome in submit_together(service, requests):
+        assert isinstance(outcome, RuntimeError)
+        assert str(outcome) == "out of memory"
+
+    # The worker survives and serves the next request
+    fake_whisper.error = None
+    assert text_of(submit_together(service, [(clip(4), False)])[0]) == "4"
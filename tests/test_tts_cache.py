@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+from tts_cache import TTSCache, normalize_text
+
+PARAMS = {"temperature": 0.75, "top_k": 50}
+
+
+def wav_of(num_samples, value=0.5):
+    return np.full(num_samples, value, dtype=np.float32)
+
+
+def test_key_normalizes_case_and_whitespace(tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path))
+    assert normalize_text("  Hello,\n  WORLD ") == "hello, world"
+    assert cache.key("Hello  world", "en", "spk", PARAMS) == cache.key(
+        "hello world\t", "en", "spk", PARAMS
+    )
+
+
+def test_key_covers_language_speaker_and_params(tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path))
+    base = cache.key("hello", "en", "spk", PARAMS)
+    assert cache.key("hello", "de", "spk", PARAMS) != base
+    assert cache.key("hello", "en", "other", PARAMS) != base
+    assert cache.key("hello", "en", "spk", {**PARAMS, "top_k": 10}) != base
+    # Param order doesn't matter
+    assert cache.key("hello", "en", "spk", dict(reversed(PARAMS.items()))) == base
+
+
+def test_get_put_round_trip_and_stats(tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path))
+    assert cache.get("k") is None
+
+    cache.put("k", wav_of(100))
+    np.testing.assert_array_equal(cache.get("k"), wav_of(100))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path):
+    probe = TTSCache(cache_dir=str(tmp_path / "probe"))
+    probe.put("a", wav_of(1000))
+    entry_bytes = probe.stats()["bytes"]
+
+    cache = TTSCache(cache_dir=str(tmp_path / "bounded"), max_bytes=2 * entry_bytes)
+    cache.put("a", wav_of(1000))
+    cache.put("b", wav_of(1000))
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", wav_of(1000))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["bytes"] == 2 * entry_bytes
+    assert sorted(os.listdir(tmp_path / "bounded")) == ["a.npy", "c.npy"]
+
+
+def test_keeps_a_single_entry_larger_than_max_bytes(tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path), max_bytes=10)
+    cache.put("big", wav_of(1000))
+    assert cache.get("big") is not None
+
+
+def test_restart_rebuilds_lru_from_disk(tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path))
+    cache.put("a", wav_of(10))
+    cache.put("b", wav_of(20))
+    os.utime(tmp_path / "a.npy", (1, 1))
+    os.utime(tmp_path / "b.npy", (2, 2))
+
+    reopened = TTSCache(cache_dir=str(tmp_path))
+    assert list(reopened._entries) == ["a", "b"]
+    assert reopened.stats()["bytes"] == cache.stats()["bytes"]
+    np.testing.assert_array_equal(reopened.get("b"), wav_of(20))
+
+
+def test_file_removed_behind_its_back_is_a_miss(tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path))
+    cache.put("a", wav_of(10))
+    os.remove(tmp_path / "a.npy")
+
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (0, 1, 0, 0)
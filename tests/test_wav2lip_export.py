@@ -0,0 +1,44 @@
+import pytest
+import torch
+
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from models import Wav2Lip, fuse_for_inference
+from wav2lip_export import OnnxWav2Lip, dummy_inputs, export_onnx, export_torchscript
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    model = Wav2Lip().eval()
+    # Random running stats, so the BatchNorm folding is exercised too
+    with torch.no_grad():
+        for module in model.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+    # Exported the way Processor.load_model serves it
+    return fuse_for_inference(model)
+
+
+@pytest.mark.parametrize("backend", ["torchscript", "onnx"])
+def test_export_matches_eager(model, backend, tmp_path):
+    if backend == "torchscript":
+        path = str(tmp_path / "wav2lip_gan.ts")
+        export_torchscript(model, path)
+        exported = torch.jit.load(path).eval()
+    else:
+        path = str(tmp_path / "wav2lip_gan.onnx")
+        export_onnx(model, path)
+        exported = OnnxWav2Lip(path)
+
+    # Traced with a batch of 2; another size checks the dynamic batch axis
+    torch.manual_seed(1)
+    inputs = dummy_inputs(3)
+    with torch.no_grad():
+        expected = model(*inputs)
+        pred = exported(*inputs)
+
+    assert pred.shape == expected.shape == (3, 3, 96, 96)
+    assert (pred - expected).abs().max().item() <= 1e-4
@@ -0,0 +1,95 @@
+import types
+
+import pytest
+import torch
+
+gpt_module = pytest.importorskip("TTS.tts.layers.xtts.gpt")
+
+from xtts_prefix_cache import SpeakerPrefixCache
+
+
+@pytest.fixture
+def gpt():
+    torch.manual_seed(0)
+    gpt = gpt_module.GPT(
+        layers=2,
+        model_dim=64,
+        heads=4,
+        max_text_tokens=50,
+        max_mel_tokens=60,
+        max_conditioning_inputs=1,
+        number_text_tokens=300,
+        num_audio_tokens=80,
+        start_audio_token=78,
+        stop_audio_token=79,
+        use_perceiver_resampler=True,
+    ).eval()
+    # At the default init attention is nearly uniform and greedy tokens barely
+    # depend on the prompt; larger weights make them follow speaker and text
+    with torch.no_grad():
+        for param in gpt.parameters():
+            if param.dim() > 1:
+                param.normal_(0, 0.1)
+    gpt.init_gpt_for_inference(kv_cache=True)
+    return gpt
+
+
+def speaker(seed):
+    return torch.randn(1, 32, 64, generator=torch.Generator().manual_seed(seed))
+
+
+TEXT = torch.randint(0, 299, (1, 12), generator=torch.Generator().manual_seed(0))
+
+
+def generate(gpt, cond_latents):
+    with torch.inference_mode():
+        return gpt.generate(cond_latents, TEXT, do_sample=False).tolist()
+
+
+def stream(gpt, cond_latents):
+    with torch.inference_mode():
+        fake_inputs = gpt.compute_embeddings(cond_latents, TEXT)
+        # The streaming generator always samples; a fixed seed makes equal
+        # logits give equal tokens
+        torch.manual_seed(0)
+        generator = gpt.get_generator(
+            fake_inputs, output_attentions=False, output_hidden_states=True
+        )
+        return [token.item() for token, _ in generator]
+
+
+def install(gpt):
+    cache = SpeakerPrefixCache(types.SimpleNamespace(gpt=gpt))
+    assert cache.install()
+    return cache
+
+
+def test_tokens_match_uncached(gpt):
+    cond_latents = speaker(1)
+    expected = generate(gpt, cond_latents)
+    expected_stream = stream(gpt, cond_latents)
+
+    cache = install(gpt)
+
+    # First call fills the cache, second reuses it
+    assert generate(gpt, cond_latents) == expected
+    assert generate(gpt, cond_latents) == expected
+    assert stream(gpt, cond_latents) == expected_stream
+    assert len(cache._entries) == 1
+
+
+def test_new_speaker_latent_is_not_served_from_cache(gpt):
+    cond_a, cond_b = speaker(1), speaker(2)
+    expected_a, expected_b = generate(gpt, cond_a), generate(gpt, cond_b)
+    assert expected_a != expected_b
+
+    cache = install(gpt)
+
+    assert generate(gpt, cond_a) == expected_a
+    assert generate(gpt, cond_b) == expected_b
+    assert len(cache._entries) == 2
+
+    # Keyed on the values, so even an in-place update misses
+    cond_a.copy_(cond_b)
+    assert generate(gpt, cond_a) == expected_b
+    assert len(cache._entries) == 2
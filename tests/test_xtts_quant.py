@@ -0,0 +1,89 @@
+import copy
+
+import pytest
+import torch
+from torch import nn
+
+pytest.importorskip("transformers")
+from transformers.pytorch_utils import Conv1D
+
+import xtts_quant
+
+
+class FakeGpt(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.blocks = nn.Sequential(Conv1D(16, 8), nn.ReLU())
+        self.head = nn.Linear(16, 4)
+        # Like XTTS's gpt_inference, reuses the layers under other names
+        self.inference = nn.Sequential(self.blocks, self.head)
+
+    def forward(self, x):
+        return self.head(self.blocks(x))
+
+
+class FakeXtts(nn.Module):
+    def __init__(self, seed=0):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.gpt = FakeGpt()
+        self.hifigan_decoder = nn.Sequential(nn.Linear(4, 4))
+
+
+def quantized_types(module):
+    return {type(m).__module__ for m in module.modules() if type(m).__name__ == "Linear"}
+
+
+def test_quantizes_gpt_only():
+    model = xtts_quant.quantize_xtts(FakeXtts())
+
+    assert not any(isinstance(m, Conv1D) for m in model.gpt.modules())
+    assert quantized_types(model.gpt) == {"torch.ao.nn.quantized.dynamic.modules.linear"}
+    assert type(model.hifigan_decoder[0]) is nn.Linear
+    assert model.gpt.inference[1] is model.gpt.head
+
+
+def test_matches_quantize_dynamic():
+    linear = nn.Sequential(nn.Linear(8, 16), nn.ReLU(), nn.Linear(16, 4))
+    expected = torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(linear), {nn.Linear}, dtype=torch.qint8
+    )
+    model = FakeXtts()
+    model.gpt = linear
+    xtts_quant.quantize_xtts(model)
+
+    x = torch.randn(3, 8)
+    assert torch.equal(model.gpt(x), expected(x))
+
+
+def test_saved_model_restores_without_fp32_gpt(tmp_path):
+    path = str(tmp_path / "model_int8.pth")
+    model = xtts_quant.quantize_xtts(FakeXtts())
+    xtts_quant.save_quantized(model, path)
+
+    checkpoint = torch.load(path, weights_only=True)
+    assert not any(key.startswith("gpt.") for key in checkpoint["model"])
+    assert not any(key.startswith("inference.") for key in checkpoint["gpt_int8"])
+
+    # What load_checkpoint(strict=False) leaves: other weights from the
+    # artifact, the GPT still at its (different) initial weights
+    fresh = FakeXtts(seed=1)
+    fresh.load_state_dict(checkpoint["model"], strict=False)
+    xtts_quant.load_quantized(fresh, path)
+
+    x = torch.randn(3, 8)
+    assert torch.equal(fresh.gpt(x), model.gpt(x))
+    assert torch.equal(fresh.gpt.inference(x), model.gpt(x))
+    y = torch.randn(3, 4)
+    assert torch.equal(fresh.hifigan_decoder(y), model.hifigan_decoder(y))
+    assert list(tmp_path.iterdir()) == [tmp_path / "model_int8.pth"]
+
+
+def test_load_rejects_mismatched_artifact(tmp_path):
+    path = str(tmp_path / "model_int8.pth")
+    model = xtts_quant.quantize_xtts(FakeXtts())
+    model.gpt.head = nn.Identity()
+    xtts_quant.save_quantized(model, path)
+
+    with pytest.raises(RuntimeError, match="does not match"):
+        xtts_quant.load_quantized(FakeXtts(), path)
@@ -0,0 +1,240 @@
+import io
+import time
+import queue
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from faster_whisper.audio import decode_audio, pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+# Whisper always works on 16 kHz mono
+WHISPER_SAMPLE_RATE = 16000
+
+
+def decode_upload(data):
+    """Decodes uploaded audio bytes (any container ffmpeg/PyAV reads) in memory."""
+    return decode_audio(io.BytesIO(data), sampling_rate=WHISPER_SAMPLE_RATE)
+
+
+def trim_silence(audio, pad_ms=200):
+    """
+    Cuts leading and trailing non-speech from 16 kHz audio using Silero VAD,
+    keeping pad_ms either side. Returns the input unchanged if no speech is found.
+    """
+    speech = get_speech_timestamps(audio, VadOptions())
+    if not speech:
+        return audio
+    pad = WHISPER_SAMPLE_RATE * pad_ms // 1000
+    start = max(0, speech[0]["start"] - pad)
+    end = min(len(audio), speech[-1]["end"] + pad)
+    return audio[start:end]
+
+
+def transcribe(whisper_model, audio, word_timestamps=False):
+    segments, info = whisper_model.transcribe(
+        audio=audio,
+        beam_size=1,
+        temperature=0,
+        word_timestamps=word_timestamps,
+        condition_on_previous_text=False,
+        no_speech_threshold=0.1,
+    )
+
+    segment_list = []
+    for segment in segments:
+        segment_dict = {
+            "start": "%.2f" % segment.start,
+            "end": "%.2f" % segment.end,
+            "text": segment.text,
+        }
+        if word_timestamps:
+            segment_dict["words"] = [
+                {"start": "%.2f" % w.start, "end": "%.2f" % w.end, "word": w.word}
+                for w in segment.words
+            ]
+        segment_list.append(segment_dict)
+
+    return {"language": info.language, "segments": segment_list}
+
+
+def transcribe_batch(whisper_model, audios, no_speech_threshold=0.1, log_prob_threshold=-1.0):
+    """
+    Transcribes several clips of at most 30 s with one batched encoder pass and
+    one batched greedy decode, returning results shaped like transcribe().
+    """
+    features = np.stack(
+        [pad_or_trim(whisper_model.feature_extractor(audio)) for audio in audios]
+    )
+    encoder_output = whisper_model.encode(features)
+
+    # Each clip gets its own language, detected from the shared encoder output
+    tokenizers = []
+    for probs in whisper_model.model.detect_language(encoder_output):
+        language = probs[0][0][2:-2]
+        tokenizers.append(
+            Tokenizer(
+                whisper_model.hf_tokenizer,
+                whisper_model.model.is_multilingual,
+                task="transcribe",
+                language=language,
+            )
+        )
+    prompts = [list(t.sot_sequence) + [t.no_timestamps] for t in tokenizers]
+
+    results = whisper_model.model.generate(
+        encoder_output,
+        prompts,
+        beam_size=1,
+        max_length=448,
+        return_scores=True,
+        return_no_speech_prob=True,
+        suppress_blank=True,
+        suppress_tokens=[-1],
+    )
+
+    transcripts = []
+    for audio, tokenizer, result in zip(audios, tokenizers, results):
+        tokens = result.sequences_ids[0]
+        # Same silence rule as WhisperModel.transcribe
+        avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+        if result.no_speech_prob > no_speech_threshold and avg_logprob < log_prob_threshold:
+            segment_list = []
+        else:
+            segment_list = [
+                {
+                    "start": "%.2f" % 0.0,
+                    "end": "%.2f" % (len(audio) / WHISPER_SAMPLE_RATE),
+                    "text": tokenizer.decode(tokens),
+                }
+            ]
+        transcripts.append({"language": tokenizer.language_code, "segments": segment_list})
+    return transcripts
+
+
+class TranscriptionService:
+    """
+    Serves Whisper from a fixed pool of worker threads fed by one queue.
+
+    Requests that fit one 30 s window and don't need word timestamps are
+    gathered for up to max_wait_ms and transcribed together with
+    transcribe_batch; everything else goes through WhisperModel.transcribe.
+    """
+
+    def __init__(self, get_model, num_workers=1, max_batch_size=8, max_wait_ms=20):
+        self.get_model = get_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self.batches = 0
+        self.batched_requests = 0
+        self.single_requests = 0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+
+        for i in range(num_workers):
+            worker = threading.Thread(
+                target=self._work, name=f"whisper-worker-{i}", daemon=True
+            )
+            worker.start()
+
+    def transcribe(self, audio, word_timestamps=False):
+        future = Future()
+        self._queue.put((audio, word_timestamps, future))
+        return future.result()
+
+    def _batchable(self, audio, word_timestamps):
+        return not word_timestamps and len(audio) <= 30 * WHISPER_SAMPLE_RATE
+
+    def _work(self):
+        while True:
+            request = self._queue.get()
+            if not self._batchable(request[0], request[1]):
+                self._run_single(request)
+                continue
+
+            # Gather whatever else arrives within the wait window
+            batch, deferred = [request], []
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if self._batchable(request[0], request[1]):
+                    batch.append(request)
+                else:
+                    deferred.append(request)
+
+            if len(batch) == 1:
+                # Alone in the window: keep the full transcribe() decoding path
+                self._run_single(batch[0])
+            else:
+                self._run_batch(batch)
+            for request in deferred:
+                self._run_single(request)
+
+    def _run_single(self, request):
+        audio, word_timestamps, future = request
+        try:
+            future.set_result(
+                transcribe(self.get_model(), audio, word_timestamps=word_timestamps)
+            )
+        except Exception as e:
+            future.set_exception(e)
+        with self._stats_lock:
+            self.single_requests += 1
+
+    def _run_batch(self, batch):
+        try:
+            results = transcribe_batch(self.get_model(), [audio for audio, _, _ in batch])
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+        with self._stats_lock:
+            self.batches += 1
+            self.batched_requests += len(batch)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "batched_requests": self.batched_requests,
+                "mean_batch_size": round(self.batched_requests / max(1, self.batches), 2),
+                "single_requests": self.single_requests,
+            }
+
+
+class TranscriptCache:
+    """Bounded LRU of transcripts keyed by the uploaded audio's content hash."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, data, word_timestamps):
+        return f"{hashlib.sha256(data).hexdigest()}_{int(word_timestamps)}"
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
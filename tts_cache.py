@@ -0,0 +1,109 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text):
+    # XTTS lowercases and ignores repeated whitespace, so these all sound the same
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized waveforms.
+
+    Keys cover the normalized text, language, speaker latents and sampling
+    params; waveforms are stored on disk as .npy files and evicted least
+    recently used first once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir="tts_cache", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Rebuild the LRU order from file mtimes, which get() refreshes on every hit
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        files = [f for f in os.listdir(self.cache_dir) if f.endswith(".npy")]
+        paths = [os.path.join(self.cache_dir, f) for f in files]
+        for path in sorted(paths, key=os.path.getmtime):
+            size = os.path.getsize(path)
+            self._entries[os.path.basename(path)[:-4]] = size
+            self._total_bytes += size
+
+    def key(self, text, language, speaker_key, params):
+        payload = json.dumps(
+            {
+                "text": normalize_text(text),
+                "language": language,
+                "speaker": speaker_key,
+                "params": params,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Returns the cached waveform, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        path = self._path(key)
+        try:
+            wav = np.load(path)
+            os.utime(path)
+        except OSError:
+            # Removed behind our back; treat as a miss
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return wav
+
+    def put(self, key, wav):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(wav, dtype=np.float32))
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._total_bytes += size - self._entries.get(key, 0)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,127 @@
+"""
+Exports the Wav2Lip generator to TorchScript and ONNX, then checks both
+against the eager model and times each runtime on this host.
+
+    python wav2lip_export.py --batch-size 32
+
+Outputs land next to the checkpoint (wav2lip_gan.ts / wav2lip_gan.onnx), which
+is where Processor(backend="torchscript" | "onnx") looks for them. Both have a
+dynamic batch axis.
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import torch
+
+
+def exported_path(checkpoint_path, backend):
+    extension = {"torchscript": ".ts", "onnx": ".onnx", "int8": "_int8.ts"}[backend]
+    return os.path.splitext(checkpoint_path)[0] + extension
+
+
+def dummy_inputs(batch_size, device="cpu"):
+    mel_batch = torch.randn(batch_size, 1, 80, 16, device=device)
+    img_batch = torch.rand(batch_size, 6, 96, 96, device=device)
+    return mel_batch, img_batch
+
+
+def export_torchscript(model, path):
+    # Traced rather than scripted: forward has a try/except TorchScript can't compile
+    with torch.no_grad():
+        traced = torch.jit.trace(model, dummy_inputs(2, next(model.parameters()).device))
+    traced.save(path)
+
+
+def export_onnx(model, path):
+    torch.onnx.export(
+        model,
+        dummy_inputs(2, next(model.parameters()).device),
+        path,
+        input_names=["mel", "face"],
+        output_names=["pred"],
+        dynamic_axes={"mel": {0: "batch"}, "face": {0: "batch"}, "pred": {0: "batch"}},
+        opset_version=17,
+    )
+
+
+class OnnxWav2Lip:
+    """Runs an exported generator with ONNX Runtime behind the eager model's call signature."""
+
+    def __init__(self, path, device="cpu"):
+        import onnxruntime
+
+        providers = ["CPUExecutionProvider"]
+        if device == "cuda":
+            providers.insert(0, "CUDAExecutionProvider")
+        self.session = onnxruntime.InferenceSession(path, providers=providers)
+
+    def eval(self):
+        return self
+
+    def __call__(self, mel_batch, img_batch):
+        (pred,) = self.session.run(
+            None,
+            {
+                "mel": np.ascontiguousarray(mel_batch.cpu().numpy()),
+                "face": np.ascontiguousarray(img_batch.cpu().numpy()),
+            },
+        )
+        return torch.from_numpy(pred)
+
+
+def _time(model, inputs, runs):
+    with torch.no_grad():
+        model(*inputs)
+        start_time = time.time()
+        for _ in range(runs):
+            pred = model(*inputs)
+    return pred, (time.time() - start_time) / runs
+
+
+def main():
+    from Wav2Lip import Processor
+
+    parser = argparse.ArgumentParser(description="Export Wav2Lip to TorchScript and ONNX")
+    parser.add_argument("--checkpoint", default=None, help="Wav2Lip checkpoint (.pth)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size for the parity check")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per backend")
+    parser.add_argument("--atol", type=float, default=1e-4, help="Max allowed abs difference")
+    args = parser.parse_args()
+
+    options = {"device": "cpu"}
+    if args.checkpoint is not None:
+        options["checkpoint_path"] = args.checkpoint
+    processor = Processor(**options)
+    model = processor.load_model(processor.checkpoint_path)
+
+    paths = {
+        backend: exported_path(processor.checkpoint_path, backend)
+        for backend in ("torchscript", "onnx")
+    }
+    export_torchscript(model, paths["torchscript"])
+    export_onnx(model, paths["onnx"])
+    for backend, path in paths.items():
+        print(f"Exported {backend} to {path}")
+
+    inputs = dummy_inputs(args.batch_size)
+    expected, eager_seconds = _time(model, inputs, args.runs)
+    print(f"torch: {eager_seconds * 1000:.1f} ms/batch")
+
+    failed = False
+    for backend, path in paths.items():
+        exported = Processor(backend=backend, **options).load_model(processor.checkpoint_path)
+        pred, seconds = _time(exported, inputs, args.runs)
+        diff = (pred - expected).abs().max().item()
+        status = "ok" if diff <= args.atol else "MISMATCH"
+        failed = failed or diff > args.atol
+        print(f"{backend}: {seconds * 1000:.1f} ms/batch, max abs diff {diff:.2e} {status}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
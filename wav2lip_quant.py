@@ -0,0 +1,112 @@
+"""
+Post-training static int8 quantization of the Wav2Lip generator.
+
+Calibrates activation ranges on real face/mel batches produced by the
+normal Processor pipeline, converts the model with FX graph mode
+quantization (conv+BN+ReLU fused, residual adds and concats quantized) and
+saves a frozen TorchScript artifact next to the checkpoint
+(wav2lip_gan_int8.ts), which Processor(backend="int8") loads.
+
+    python wav2lip_quant.py --faces trump.jpg biden2.jpeg --audios trump.wav
+
+Measure the quality impact with eval_wav2lip_int8.py before switching.
+"""
+
+import argparse
+
+import numpy as np
+import torch
+from torch import nn
+
+import audio
+
+
+class _InferenceGraph(nn.Module):
+    """
+    The 4-D (frame batch) path of Wav2Lip.forward without its input shape
+    branch, which FX can't trace.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, mel_batch, img_batch):
+        return self.model.decode(self.model.encode_audio(mel_batch), img_batch)
+
+
+def face_mel_batches(processor, face, audio_file, batch_size=32, fps=25, mel_step_size=16):
+    """Yields (mel_batch, img_batch) NCHW tensors exactly as Processor.render feeds the model."""
+    full_frames, fps = processor.read_frames(face, fps)
+    mel = audio.melspectrogram(audio.load_wav(audio_file, 16000))
+    mel_chunks = processor.get_mel_chunks(mel, fps, mel_step_size)
+    full_frames = full_frames[: len(mel_chunks)]
+
+    for img_batch, mel_batch, _, _ in processor.datagen(
+        full_frames, mel_chunks, wav2lip_batch_size=batch_size
+    ):
+        img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2)))
+        mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2)))
+        yield mel_batch, img_batch
+
+
+@torch.no_grad()
+def quantize_wav2lip(model, calibration_batches, backend="x86"):
+    """
+    Returns a frozen TorchScript int8 version of an fp32 (un-fused) Wav2Lip,
+    with activation ranges observed on calibration_batches.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = backend
+    graph = _InferenceGraph(model.cpu().eval()).eval()
+    calibration_batches = list(calibration_batches)
+    prepared = prepare_fx(
+        graph, get_default_qconfig_mapping(backend), calibration_batches[0]
+    )
+    for mel_batch, img_batch in calibration_batches:
+        prepared(mel_batch, img_batch)
+    quantized = convert_fx(prepared)
+
+    traced = torch.jit.trace(quantized, calibration_batches[0])
+    return torch.jit.freeze(traced)
+
+
+def main():
+    from Wav2Lip import Processor
+    from wav2lip_export import exported_path
+
+    parser = argparse.ArgumentParser(description="Int8 post-training quantization of Wav2Lip")
+    parser.add_argument("--checkpoint", default=None, help="Wav2Lip checkpoint (.pth)")
+    parser.add_argument("--faces", nargs="+", default=["trump.jpg", "trump1.jpeg", "biden2.jpeg"])
+    parser.add_argument("--audios", nargs="+", default=["trump.wav", "giongnu.wav"])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--calibration-batches", type=int, default=16, help="Batches to calibrate on")
+    args = parser.parse_args()
+
+    # Quantize from the BN-carrying model; FX does its own conv+BN+ReLU fusion
+    options = {"device": "cpu", "fuse_bn": False}
+    if args.checkpoint is not None:
+        options["checkpoint_path"] = args.checkpoint
+    processor = Processor(**options)
+    model = processor.load_model(processor.checkpoint_path)
+
+    batches = []
+    for face in args.faces:
+        for audio_file in args.audios:
+            for batch in face_mel_batches(processor, face, audio_file, args.batch_size):
+                batches.append(batch)
+    # Spread the calibration budget evenly over every face/audio pair
+    step = max(1, len(batches) // args.calibration_batches)
+    batches = batches[::step][: args.calibration_batches]
+    print(f"Calibrating on {len(batches)} batches")
+
+    quantized = quantize_wav2lip(model, batches)
+    path = exported_path(processor.checkpoint_path, "int8")
+    quantized.save(path)
+    print(f"Saved int8 generator to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+import torch.nn.functional as F
+
+
+class SpeakerPrefixCache:
+    """
+    Reuses the GPT key/value cache of each speaker's conditioning prefix.
+
+    XTTS prepends the 32 gpt_cond_latent vectors to every prompt, and because its
+    GPT-2 runs without learned absolute positions their keys and values depend on
+    the speaker alone. install() wraps the model's gpt.generate (used by
+    inference) and gpt.get_generator (used by inference_stream) so each request
+    only runs the text tokens on top of the cached speaker prefix.
+    """
+
+    def __init__(self, xtts_model, max_entries=8):
+        self.gpt = xtts_model.gpt
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Prompt of the inference_stream call being set up on this thread
+        self._local = threading.local()
+        self._original_generate = None
+        self._original_get_generator = None
+        self._original_compute_embeddings = None
+
+    def install(self):
+        if getattr(self.gpt, "ds_engine", None) is not None:
+            # DeepSpeed swaps in its own fused transformer; leave it alone
+            print("DeepSpeed inference enabled, speaker prefix cache not installed.")
+            return False
+        if not self.gpt.gpt_inference.kv_cache:
+            return False
+        self._original_generate = self.gpt.generate
+        self._original_get_generator = self.gpt.get_generator
+        self._original_compute_embeddings = self.gpt.compute_embeddings
+        self.gpt.generate = self._generate
+        self.gpt.get_generator = self._get_generator
+        self.gpt.compute_embeddings = self._compute_embeddings
+        return True
+
+    def _key(self, cond_latents):
+        data = cond_latents.detach().float().cpu().numpy().tobytes()
+        return hashlib.sha1(data).hexdigest()
+
+    @torch.inference_mode()
+    def precompute(self, cond_latents):
+        """Returns the key/value cache for a speaker's conditioning prefix."""
+        key = self._key(cond_latents)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        outputs = self.gpt.gpt_inference.transformer(
+            inputs_embeds=cond_latents, use_cache=True, return_dict=True
+        )
+        past_key_values = outputs.past_key_values
+
+        with self._lock:
+            self._entries[key] = past_key_values
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return past_key_values
+
+    def _cacheable(self, cond_latents, hf_generate_kwargs):
+        return (
+            cond_latents.shape[0] == 1
+            and hf_generate_kwargs.get("num_return_sequences", 1) == 1
+            and hf_generate_kwargs.get("num_beams", 1) == 1
+        )
+
+    def _prefill(self, cond_latents, text_inputs):
+        """
+        Embeds the prompt like GPT.compute_embeddings and runs only its text
+        tokens on top of a copy of the speaker's cached prefix. Returns the
+        generate() inputs and the key/value cache to start sampling from.
+        """
+        gpt = self.gpt
+        speaker_past = self.precompute(cond_latents)
+
+        # Same text embedding as GPT.compute_embeddings
+        text_inputs = F.pad(text_inputs, (0, 1), value=gpt.stop_text_token)
+        text_inputs = F.pad(text_inputs, (1, 0), value=gpt.start_text_token)
+        emb = gpt.text_embedding(text_inputs) + gpt.text_pos_embedding(text_inputs)
+
+        # Extend a copy of the speaker cache with the text; generation mutates caches
+        outputs = gpt.gpt_inference.transformer(
+            inputs_embeds=emb,
+            past_key_values=copy.deepcopy(speaker_past),
+            use_cache=True,
+            return_dict=True,
+        )
+
+        prefix_emb = torch.cat([cond_latents, emb], dim=1)
+        gpt.gpt_inference.store_prefix_emb(prefix_emb)
+        gpt_inputs = torch.full(
+            (1, prefix_emb.shape[1] + 1),
+            fill_value=1,
+            dtype=torch.long,
+            device=text_inputs.device,
+        )
+        gpt_inputs[:, -1] = gpt.start_audio_token
+        return gpt_inputs, outputs.past_key_values
+
+    @torch.inference_mode()
+    def _generate(self, cond_latents, text_inputs, **hf_generate_kwargs):
+        input_tokens = hf_generate_kwargs.pop("input_tokens", None)
+        if (
+            input_tokens is not None
+            or not self._cacheable(cond_latents, hf_generate_kwargs)
+            or "return_dict_in_generate" in hf_generate_kwargs
+        ):
+            return self._original_generate(
+                cond_latents, text_inputs, input_tokens=input_tokens, **hf_generate_kwargs
+            )
+
+        gpt = self.gpt
+        gpt_inputs, past_key_values = self._prefill(cond_latents, text_inputs)
+
+        # With past_key_values set, the first step only feeds the start-audio token
+        gen = gpt.gpt_inference.generate(
+            gpt_inputs,
+            bos_token_id=gpt.start_audio_token,
+            pad_token_id=gpt.stop_audio_token,
+            eos_token_id=gpt.stop_audio_token,
+            max_length=gpt.max_gen_mel_tokens + gpt_inputs.shape[-1],
+            past_key_values=past_key_values,
+            **hf_generate_kwargs,
+        )
+        return gen[:, gpt_inputs.shape[1] :]
+
+    def _compute_embeddings(self, cond_latents, text_inputs):
+        # inference_stream embeds the prompt and then hands get_generator only
+        # placeholder ids, so keep the speaker latents and text for it
+        self._local.stream_prompt = (cond_latents, text_inputs)
+        return self._original_compute_embeddings(cond_latents, text_inputs)
+
+    def _get_generator(self, fake_inputs, **hf_generate_kwargs):
+        prompt = getattr(self._local, "stream_prompt", None)
+        self._local.stream_prompt = None
+        # compute_embeddings adds start/stop text tokens and the start-audio token
+        if (
+            prompt is None
+            or fake_inputs.shape[1] != prompt[0].shape[1] + prompt[1].shape[1] + 3
+            or not self._cacheable(prompt[0], hf_generate_kwargs)
+        ):
+            return self._original_get_generator(fake_inputs, **hf_generate_kwargs)
+
+        with torch.inference_mode():
+            gpt_inputs, past_key_values = self._prefill(*prompt)
+        # The stock generator with sampling started from the cached prefix;
+        # generate_stream passes past_key_values on to the model
+        return self._original_get_generator(
+            gpt_inputs, past_key_values=past_key_values, **hf_generate_kwargs
+        )
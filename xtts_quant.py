@@ -0,0 +1,132 @@
+import os
+import threading
+
+import torch
+import torch.ao.nn.quantized.dynamic as nnqd
+import torch.nn as nn
+
+
+def _swap_linears(module, make):
+    """
+    Replaces every HF GPT-2 Conv1D and nn.Linear in module with make(child).
+    A layer reachable under several names (XTTS's gpt_inference reuses the
+    GPT's blocks and heads) gets one replacement shared by all of them.
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    replacements = {}
+    for parent in list(module.modules()):
+        for name, child in list(parent.named_children()):
+            if id(child) in replacements:
+                setattr(parent, name, replacements[id(child)])
+            elif isinstance(child, Conv1D) or type(child) is nn.Linear:
+                replacements[id(child)] = make(child)
+                setattr(parent, name, replacements[id(child)])
+    return module
+
+
+def _quantize_linear(child):
+    """
+    Dynamic int8 version of a Conv1D or nn.Linear, the same as quantize_dynamic
+    would produce. Conv1D is a linear layer with a transposed weight, but
+    dynamic quantization only recognises nn.Linear, so it is converted first.
+    """
+    if type(child) is not nn.Linear:
+        linear = nn.Linear(child.weight.shape[0], child.nf)
+        linear.weight.data = child.weight.data.t().contiguous()
+        linear.bias.data = child.bias.data
+        child = linear
+    child.qconfig = torch.ao.quantization.default_dynamic_qconfig
+    return nnqd.Linear.from_float(child)
+
+
+def _empty_quantized_linear(child):
+    """
+    An int8 Linear of the same shape for load_state_dict to fill in. Built
+    1x1 and resized, as packing full-size zero weights costs as much as
+    packing the real ones.
+    """
+    if type(child) is nn.Linear:
+        in_features, out_features = child.in_features, child.out_features
+    else:
+        in_features, out_features = child.weight.shape[0], child.nf
+    linear = nnqd.Linear(1, 1, bias_=child.bias is not None, dtype=torch.qint8)
+    linear.in_features, linear.out_features = in_features, out_features
+    return linear
+
+
+def _unique_state_dict(module):
+    """
+    state_dict without the entries of modules reachable under a second name.
+    Quantized weights are unpacked into new tensors on every save, so
+    torch.save can't share them and would store each such module twice.
+    """
+    names = {name for name, _ in module.named_modules()}
+    # Filtered in place to keep the version _metadata quantized modules load by
+    state_dict = module.state_dict()
+    for key in list(state_dict):
+        if key.rpartition(".")[0] not in names:
+            del state_dict[key]
+    return state_dict
+
+
+def quantize_xtts(xtts_model):
+    """
+    Applies dynamic int8 quantization to the XTTS GPT for CPU serving.
+
+    Weights of every linear layer in the GPT (including the converted Conv1D
+    projections) are stored as int8 and activations are quantized on the fly,
+    so no calibration data is needed. The HiFi-GAN decoder stays fp32: it holds
+    the speaker encoder that computes the speaker embedding, and its own
+    convolutions can't be quantized dynamically anyway.
+    """
+    xtts_model.to("cpu").eval()
+    _swap_linears(xtts_model.gpt, _quantize_linear)
+    return xtts_model
+
+
+def save_quantized(xtts_model, path):
+    """
+    Saves a quantize_xtts model as a checkpoint that load_checkpoint reads
+    (the fp32 weights of everything but the GPT under "model") plus the int8
+    GPT under "gpt_int8". Only tensors, so it loads with weights_only=True.
+    """
+    state_dict = xtts_model.state_dict()
+    for key in list(state_dict):
+        if key.startswith("gpt."):
+            del state_dict[key]
+    checkpoint = {"model": state_dict, "gpt_int8": _unique_state_dict(xtts_model.gpt)}
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        torch.save(checkpoint, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def load_quantized(xtts_model, path):
+    """
+    Restores the int8 GPT saved by save_quantized into a model loaded from
+    the same file with load_checkpoint(strict=False), whose GPT still holds
+    its random initial weights. Those are never quantized: the GPT's linear
+    layers are swapped for empty int8 ones and filled from the file.
+    """
+    gpt = _swap_linears(xtts_model.to("cpu").gpt, _empty_quantized_linear)
+    checkpoint = torch.load(path, map_location="cpu", weights_only=True, mmap=True)
+    state_dict = checkpoint["gpt_int8"]
+    # Every name of a shared module loads from the entries saved under its first
+    first_names = {}
+    for name, module in gpt.named_modules(remove_duplicate=False):
+        first = first_names.setdefault(id(module), name)
+        if first != name:
+            for key in list(state_dict):
+                if key.rpartition(".")[0] == first:
+                    state_dict[name + key[len(first):]] = state_dict[key]
+    try:
+        gpt.load_state_dict(state_dict)
+    except (KeyError, RuntimeError) as e:
+        # Quantized modules raise KeyError on a missing entry
+        raise RuntimeError(f"{path} does not match the XTTS GPT: {e}") from e
+    return xtts_model.eval()